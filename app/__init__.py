@@ -1,37 +1,72 @@
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from app.errors import register_error_handlers
+from app.replicas import RoutingSession
 
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 
 from app.models.user import User
 from app.models.book import Book
+from app.models.change import Change
 
 
 def create_app():
     
     app = Flask(__name__, instance_relative_config=True)
-    app.config.from_object('config.Config')
+    from config import CONFIGS, engine_options
+    app_env = os.getenv("APP_ENV", "development")
+    
+    if app_env not in CONFIGS:
+        raise RuntimeError(f"Unknown APP_ENV {app_env!r}, it must be one of: {', '.join(CONFIGS)}")
+    
+    app.config.from_object(CONFIGS[app_env])
     app.config.from_pyfile("config.py", silent=True)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
+    
+    from app.json_provider import init_json_provider
+    init_json_provider(app)
+    
+    from app.instrumentation import instrumentation
+    instrumentation.init_app(app)
+    
+    from app.replicas import replica_router
+    replica_router.init_app(app)
     
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
     
+    from app.identity import register_identity_loaders
+    register_identity_loaders(app, jwt)
+    
+    from app.ratelimit import login_limiter
+    login_limiter.init_app(app)
+    
+    from app.response_cache import response_cache
+    response_cache.init_app(app)
+    
     from app.blueprints.book.routes import book_bp
     from app.blueprints.user.routes import user_bp
     from app.blueprints.auth.routes import auth_bp
+    from app.blueprints.change.routes import change_bp
     
     
     app.register_blueprint(user_bp, url_prefix="/users")
     app.register_blueprint(book_bp, url_prefix="/books")
     app.register_blueprint(auth_bp)
+    app.register_blueprint(change_bp)
+    
+    if app.config["INSTRUMENTATION_ENABLED"] and app.config["METRICS_ENABLED"]:
+        from app.blueprints.metrics.routes import metrics_bp
+        app.register_blueprint(metrics_bp)
+    
     register_error_handlers(app)
     
     return app
\ No newline at end of file
@@ -0,0 +1,329 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from flask import current_app, g, request
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+from app import db
+from app.identity import identity_cache, snapshot
+from app.instrumentation import end_phase
+from app.models.user import User
+
+#ASGI entry point of the app (see asgi.py)
+#the single row reads of the book and user blueprints have async versions that use an AsyncSession,
+#so a worker keeps serving other requests while one waits on the database
+#they read from ASYNC_DATABASE_URI (the primary unless it is set to a replica), not from the read replicas
+#every other request (the lists, writes, auth) and every request the async handlers cannot answer
+#themselves (bad or missing token, unknown user) goes to the flask app unchanged and runs on a thread
+#of a pool of ASGI_SYNC_THREADS, so those are as concurrent as under a gthread worker, not more
+
+#sync driver -> async driver of the same database
+
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+mysqldb": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+#method to get the async url of the database the flask app uses
+
+def async_database_uri(url):
+    if url.drivername not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver known for {url.drivername}, set ASYNC_DATABASE_URI")
+
+    return url.set(drivername=ASYNC_DRIVERS[url.drivername])
+
+
+class AsyncDatabase:
+
+    def __init__(self):
+        self.engine = None
+        self.session = None
+
+    def init_app(self, app):
+        uri = app.config["ASYNC_DATABASE_URI"]
+
+        if not uri:
+            with app.app_context():
+                uri = async_database_uri(db.engine.url)
+
+        self.engine = create_async_engine(uri, **app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+
+
+async_db = AsyncDatabase()
+
+
+#asgiref's WsgiToAsgi runs the WSGI app with a thread sensitive sync_to_async, i.e. on one thread shared by
+#all requests, which would serve the requests going to the flask app one at a time. This runs them on a pool
+#with loop.run_in_executor, the request body is read first and the response is sent chunk by chunk from the
+#thread so streamed responses (NDJSON) are not held in memory
+
+class ThreadedWsgiToAsgi:
+
+    def __init__(self, wsgi_application, threads):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            raise ValueError(f"WSGI app can't handle the {scope['type']} ASGI scope")
+
+        body = SpooledTemporaryFile(max_size=65536)
+
+        while True:
+            message = await receive()
+
+            if message["type"] == "http.disconnect":
+                return
+
+            body.write(message.get("body", b""))
+
+            if not message.get("more_body"):
+                break
+
+        body.seek(0)
+        environ = build_environ(scope)
+        environ["wsgi.input"] = body
+        environ["wsgi.multithread"] = True
+
+        loop = asyncio.get_running_loop()
+
+        try:
+            await loop.run_in_executor(self.executor, self.run_wsgi_app, environ, send, loop)
+        finally:
+            body.close()
+
+    def run_wsgi_app(self, environ, send, loop):
+        response_start = None
+
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            nonlocal response_start
+            response_start = {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+            }
+
+        iterable = self.wsgi_application(environ, start_response)
+
+        try:
+            for chunk in iterable:
+                if response_start is not None:
+                    send_message(response_start)
+                    response_start = None
+
+                if chunk:
+                    send_message({"type": "http.response.body", "body": chunk, "more_body": True})
+
+            if response_start is not None:
+                send_message(response_start)
+
+            send_message({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+
+#holds the async routes of a blueprint, registered on the ASGI app with a url prefix like flask blueprints
+#handlers are called as handler(session, user_id, claims, **url_values) and return what a flask view returns
+#the endpoint names are the ones of the flask routes ("books.get_book"), e.g. for the metrics
+
+class AsyncBlueprint:
+
+    def __init__(self, name):
+        self.name = name
+        self.routes = []
+
+    def route(self, rule):
+        def decorator(handler):
+            self.routes.append((rule, f"{self.name}.{handler.__name__}", handler))
+            return handler
+        return decorator
+
+
+#method to build the WSGI environ of an ASGI request, so the flask request context can be used
+
+def build_environ(scope):
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode().decode("latin-1"),
+        "PATH_INFO": path.encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": False,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+    return environ
+
+
+#method to read the claims of the access token, returns None when flask_jwt_extended would reject the request
+
+def read_access_token():
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+
+    if scheme != current_app.config["JWT_HEADER_TYPE"] or not token:
+        return None
+
+    try:
+        claims = decode_token(token)
+    except (JWTExtendedException, PyJWTError):
+        return None
+
+    return claims if claims.get("type") == "access" else None
+
+
+#same lookup as the user_lookup_loader, returns None when the user does not exist
+
+async def load_identity(session, claims):
+    user_id = int(claims[current_app.config["JWT_IDENTITY_CLAIM"]])
+
+    if identity_cache.get(user_id) is None:
+        user = await session.get(User, user_id)
+
+        if user is None:
+            return None
+
+        identity_cache.set(user_id, snapshot(user))
+
+    end_phase("auth")
+    return user_id
+
+
+class AsgiApp:
+
+    def __init__(self, app, blueprints):
+        self.app = app
+        self.wsgi = ThreadedWsgiToAsgi(app, app.config["ASGI_SYNC_THREADS"])
+        self.url_map = Map()
+
+        for blueprint, url_prefix in blueprints:
+            for rule, endpoint, handler in blueprint.routes:
+                self.url_map.add(Rule(url_prefix + rule, endpoint=(endpoint, handler), methods=["GET"]))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        if scope["type"] == "http" and scope["method"] == "GET":
+            environ = build_environ(scope)
+
+            try:
+                route, values = self.url_map.bind_to_environ(environ).match()
+            except HTTPException:
+                route = None
+
+            if route:
+                response = await self.dispatch(environ, route, values)
+
+                if response is not None:
+                    return await send_response(response, send)
+
+        await self.wsgi(scope, receive, send)
+
+    #runs a handler inside a flask request context, so jsonify, request.args, the before / after request hooks
+    #and the error handlers work as usual, returns None when the request has to go to the flask app
+
+    async def dispatch(self, environ, route, values):
+        endpoint, handler = route
+
+        with self.app.request_context(environ):
+            g.endpoint = endpoint
+
+            try:
+                response = self.app.preprocess_request()
+
+                if response is None:
+                    response = await self.call_handler(handler, values)
+
+                    if response is None:
+                        return None
+
+                response = self.app.make_response(response)
+            except Exception as e:
+                response = self.app.make_response(self.app.handle_exception(e))
+
+            return self.app.process_response(response)
+
+    async def call_handler(self, handler, values):
+        claims = read_access_token()
+
+        if claims is None:
+            return None
+
+        async with async_db.session() as session:
+            user_id = await load_identity(session, claims)
+
+            if user_id is None:
+                return None
+
+            return await handler(session, user_id, claims, **values)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await async_db.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def send_response(response, send):
+    headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in response.headers.items()]
+
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+def create_asgi_app(app):
+    async_db.init_app(app)
+
+    from app.blueprints.book.async_routes import book_async_bp
+    from app.blueprints.user.async_routes import user_async_bp
+
+    return AsgiApp(app, [(user_async_bp, "/users"), (book_async_bp, "/books")])
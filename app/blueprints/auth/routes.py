@@ -1,116 +1,18 @@
-import re
+import math
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import create_access_token, create_refresh_token
-from email_validator import validate_email, EmailNotValidError
 from app import db
 from app.models.user import User
+from app.changes import record_changes
+from app.validation import validate_credentials, validate_user_create
+from app.identity import invalidate_identity
+from app.ratelimit import login_limiter
+from app.response_cache import invalidate_responses
 
 #Creating auth Blueprint
 
 auth_bp = Blueprint("auth", __name__)
 
-#--------- VALIDATION HELPERS ---------
-
-#method to validate a password
-
-def validate_password(password):
-    #rules: min 8 chars, at least 1 uppercase, 1 lowercase, 1 digit, 1 special char
-    pattern = r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&])[A-Za-z\d@$!%*?&]{8,}$'
-
-    if re.match(pattern, password):
-        return True
-    
-    return False
-
-
-#method to validate a user
-
-def validate_user_create(data):
-    errors = {}
-    
-    name_pattern = re.compile(r"^[A-Za-z ]+$")
-    
-    if not data:
-        errors["data"] = "User data is required"
-        return errors
-    
-    #first_name
-    
-    if "first_name" not in data or not data["first_name"]:
-        errors["first_name"] = "First name is required"
-        
-    elif not name_pattern.match(data["first_name"]):
-        errors["first_name"] = "First name should only contain alphabets and spaces"
-        
-    #last_name
-        
-    if "last_name" not in data or not data["last_name"]:
-        errors["last_name"] = "Last name is required"
-        
-    elif not name_pattern.match(data["last_name"]):
-        errors["last_name"] = "Last name should only contain alphabets and spaces"
-        
-    #email
-    
-    if "email_id" not in data or not data["email_id"]:
-        errors["email_id"] = "email id is required"
-    
-    else:
-        try:
-            validate_email(data["email_id"])
-        except EmailNotValidError as e:
-            errors["email_id"] = str(e)
-            
-    #password
-    
-    if "password" not in data or not data["password"]:
-        errors["password"] = "Password is required"
-        
-    elif not validate_password(data["password"]):
-        errors["password"] = "password must contain min 8 chars, at least 1 uppercase, 1 lowercase, 1 digit, 1 special char"
-        
-    #role
-        
-    if "role" in data:
-        if not data["role"]:
-            errors["role"] = "Invalid role"
-        if data["role"].lower() != "admin" and data["role"].lower() != "user":
-            errors["role"] = "Invalid role"
-            
-            
-    return errors
-
-#method to validate user login credentials
-def validate_credentials(data):
-    
-    errors = {}
-    
-    if not data:
-        errors["data"] = "Credentials are required"
-        return errors
-    
-    #email id
-    
-    if "email_id" not in data or not data["email_id"]:
-        errors["email_id"] = "Email Id is required"
-        
-    else:
-        try:
-            validate_email(data["email_id"])
-        except EmailNotValidError as e:
-            errors["email_id"] = str(e)
-            
-    #password
-    
-    if "password" not in data or not data["password"]:
-        errors["password"] = "Password is required"
-        
-    elif not validate_password(data["password"]):
-        errors["password"] = "password must contain min 8 chars, at least 1 uppercase, 1 lowercase, 1 digit, 1 special char"
-
-    
-    return errors
-
 #-------------- API ENDPOINTS ----------------
 
 
@@ -140,7 +42,10 @@ def register():
         user.role = data["role"].lower()
         
     db.session.add(user)
+    db.session.flush()
+    record_changes("user", "insert", [user.id])
     db.session.commit()
+    invalidate_responses("users")
     
     return jsonify({"Message":"User Registered Successfully", 
                     "Details": user.to_dict()}), 201
@@ -152,6 +57,16 @@ def register():
 def login():
     data = request.get_json()
     
+    #throttle attempts per client ip and per email before any validation or database work
+    
+    email_id = data.get("email_id") if isinstance(data, dict) else None
+    email_id = email_id.strip().lower() if isinstance(email_id, str) else None
+    
+    retry_after = login_limiter.hit(request.remote_addr, email_id)
+    
+    if retry_after:
+        return jsonify({"Error": "Too Many Login Attempts"}), 429, {"Retry-After": str(math.ceil(retry_after))}
+    
     errors = validate_credentials(data)
     
     if errors:
@@ -162,6 +77,13 @@ def login():
     if not existing_user or not existing_user.check_password(data["password"]):
         return jsonify({"Error": "Invalid username or password"}), 401
     
+    #upgrade the stored hash when the hashing parameters have changed
+    
+    if existing_user.password_needs_rehash():
+        existing_user.set_password(data["password"])
+        db.session.commit()
+        invalidate_identity(existing_user.id)
+    
     
     #access token and refresh token creation
     #remember identity must contain which can be casted to string Eg. like username or id
@@ -0,0 +1,42 @@
+from flask import jsonify, request
+from sqlalchemy import select
+from app.asgi import AsyncBlueprint
+from app.models.book import Book
+from app.conditional import book_etag, etag_response, is_not_modified, not_modified_response, variant_etag
+from app.serialization import BOOK_FIELDS, InvalidFields, book_columns, books_to_dicts, parse_fields
+
+#async versions of the book read endpoints, served by the ASGI app with the same contract as routes.py
+
+book_async_bp = AsyncBlueprint("books")
+
+
+#Get a book by id
+
+@book_async_bp.route("/<int:book_id>")
+async def get_book(session, requesting_user_id, claims, book_id):
+
+    #sparse fieldsets, only the requested fields are selected
+
+    try:
+        fields = parse_fields(request.args.get("fields"), BOOK_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
+
+    #only the owner and the version are read until the body is actually needed
+
+    row = (await session.execute(select(Book.user_id, Book.version).where(Book.id == book_id))).first()
+
+    if not row:
+        return jsonify({"Error": "Book Not Found"}), 404
+
+    if claims["role"].lower() != "admin" and requesting_user_id != row.user_id:
+        return jsonify({"Error": "Unauthorized Access"}), 403
+
+    etag = variant_etag(book_etag(book_id, row.version), fields)
+
+    if is_not_modified(etag):
+        return not_modified_response(etag)
+
+    book = (await session.execute(select(*book_columns(fields)).where(Book.id == book_id))).first()
+
+    return etag_response(books_to_dicts([book], fields)[0], etag)
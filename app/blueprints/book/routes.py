@@ -1,51 +1,121 @@
-import re
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+import csv
+import io
+import zlib
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt, current_user
+from sqlalchemy import bindparam, delete, func, select, update
 from app import db
 from app.models.book import Book
-from app.models.user import User
+from app.changes import record_changes
+from app.conditional import book_etag, bump_books_versions, etag_response, is_not_modified, not_modified_response, precondition_failed, precondition_failed_response, variant_etag
+from app.counting import COUNT_STRATEGIES, make_counter
+from app.pagination import InvalidSort, is_cursor_request, paginate_query, parse_sort
+from app.response_cache import cached_response, invalidate_responses
+from app.search import search_books
+from app.serialization import BOOK_FIELDS, InvalidFields, book_columns, books_to_dicts, parse_fields, rows_by_id
+from app.validation import is_valid_id, parse_id_array, parse_id_list, validate_book_update
 
 #creating book blueprint
 
 book_bp = Blueprint("books", __name__)
 
+#columns GET /books can be sorted on, each one has an index (ix_book_name, ix_book_author)
 
-#---------- VALIDATION HELPERS -----------
+BOOK_SORTS = {"id": Book.id, "Name": Book.Name, "Author": Book.Author}
 
 
-#method to validate an updated book    
+#----------- FILTER HELPERS ------------
 
-def validate_book_update(data):
-    
-    errors = {}
-    
-    name_pattern = re.compile(r"^[A-Za-z ]+$")
+#method to apply the Author / Name / user_id filters of GET /books
+
+def filter_books(query, args):
+    author = args.get("Author")
+    name = args.get("Name")
+    user_id = args.get("user_id")
     
-    if not data:
-        errors["data"] = "Book data is required"
-        return errors
+    if author:
+        query = query.filter(Book.Author.like(f"%{author}%"))
+    if name:
+        query = query.filter(Book.Name.like(f"%{name}%"))
+    if user_id:
+        query = query.filter(Book.user_id == user_id)
     
-    #Name
-    if "Name" in data:
-        if not data["Name"]:
-            errors["Name"] = "Book name is required"
-            
-        elif len(data["Name"]) < 2:
-            errors["Name"] = "Book name must be atleast 2 characters long"
-        
-        elif len(data["Name"]) > 255:
-            errors["Name"] = "Book name must not exceed 255 characters"
+    return query
+
+
+#----------- EXPORT HELPERS ------------
+
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_BATCH_SIZE = 1000
+
+#method to serialize the rows of a query batch by batch, rows are read from a server side cursor (yield_per)
+#so memory use does not grow with the number of books
+
+def export_books(query, export_format, fields):
+    batches = db.session.execute(query.statement.execution_options(yield_per=EXPORT_BATCH_SIZE)).partitions()
+    dumps = current_app.json.dumps
+    
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
         
-    #Author
-    if "Author" in data:
-        if not data["Author"]:
-            errors["Author"] = "Author name is required"
-            
-        elif not name_pattern.match(data["Author"]):
-            errors["Author"] = "Author name must contain only alphabets and spaces"
-            
+        for rows in batches:
+            writer.writerows([getattr(row, field) for field in fields] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
             
-    return errors
+        yield buffer.getvalue()
+    else:
+        for rows in batches:
+            yield "".join(dumps(book) + "\n" for book in books_to_dicts(rows, fields))
+
+
+#method to gzip a stream of text chunks as they are produced
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        
+        if data:
+            yield data
+    
+    yield compressor.flush()
+
+
+#----------- LOOKUP HELPERS ------------
+
+#method to resolve many book ids at once, every book is checked like in get_book
+#admin gets any book, a user only their own, the others are listed as forbidden or missing
+
+def lookup_books(ids):
+    try:
+        fields = parse_fields(request.args.get("fields"), BOOK_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
+    
+    if len(ids) > current_app.config["BULK_MAX_ITEMS"]:
+        return jsonify({"Error": "Validation Failed", "Details": {"ids": f"At most {current_app.config['BULK_MAX_ITEMS']} books can be fetched at once"}}), 400
+    
+    #the owner is selected for the check even when fields= leaves it out
+    
+    columns = book_columns(fields)
+    
+    if Book.user_id not in columns:
+        columns.append(Book.user_id)
+    
+    books = rows_by_id(columns, Book.id, ids)
+    is_admin = get_jwt()["role"].lower() == "admin"
+    requesting_user_id = current_user.id
+    
+    found = [books[book_id] for book_id in ids if book_id in books and (is_admin or books[book_id].user_id == requesting_user_id)]
+    forbidden = [book_id for book_id in ids if book_id in books and not is_admin and books[book_id].user_id != requesting_user_id]
+    missing = [book_id for book_id in ids if book_id not in books]
+    
+    return jsonify({"found": books_to_dicts(found, fields), "forbidden": forbidden, "missing": missing}), 200
 
 
 #----------- API ENDPOINTS RELATED TO BOOK ------------
@@ -54,94 +124,177 @@ def validate_book_update(data):
 
 @book_bp.route("/", methods=["GET"])
 @jwt_required()
+@cached_response("books")
 def get_books():
     
-    requesting_user_id = int(get_jwt_identity())
-    requesting_user = User.query.get(requesting_user_id)
     claims = get_jwt()
     
-    if not requesting_user:
-        return jsonify({"Error": "User not Found"}), 404
+    #?ids=1,2,3 fetches those books only, open to users since each book is checked
+    
+    if "ids" in request.args:
+        ids = parse_id_list(request.args["ids"])
+        
+        if not ids:
+            return jsonify({"Error": "Validation Failed", "Details": {"ids": "ids must be a comma separated list of book ids"}}), 400
+        
+        return lookup_books(ids)
     
     if claims["role"].lower() != "admin":
         return jsonify({"Error": "Unauthorized Access"}), 403
     
+    #sparse fieldsets, only the requested fields are selected
+    
+    try:
+        fields = parse_fields(request.args.get("fields"), BOOK_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
+    
+    #sorting, always ends with the id so pages are stable
+    
+    try:
+        sort = parse_sort(request.args.get("sort"), BOOK_SORTS)
+    except InvalidSort as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"sort": str(e)}}), 400
+    
     #filtering
     
-    query = Book.query
-    author = request.args.get("Author")
-    name = request.args.get("Name")
-    user_id = request.args.get("user_id")
+    #only the serialized columns are selected, no ORM objects are built for the list
+    #the sort column is selected as well since cursors carry its value
     
-    if author:
-        query = query.filter(Book.Author.like(f"%{author}%"))
-    if name:
-        query = query.filter(Book.Name.like(f"%{name}%"))
-    if user_id:
-        query = query.filter_by(user_id=user_id)
+    columns = book_columns(fields)
+    
+    if sort[0] not in columns:
+        columns.append(sort[0])
+    
+    query = filter_books(db.session.query(*columns), request.args)
+    
+    #full text search, ranked by relevance unless a sort is asked for or in cursor mode
+    
+    term = request.args.get("q")
+    
+    if term:
+        query = search_books(query, term, ranked=not is_cursor_request(request.args) and "sort" not in request.args)
+        
+    #total count strategy, exact / cached / approximate
+    
+    strategy = request.args.get("count", current_app.config["BOOK_COUNT_STRATEGY"])
+    
+    if strategy not in COUNT_STRATEGIES:
+        return jsonify({"Error": "Validation Failed", "Details": {"count": "count must be exact, cached or approximate"}}), 400
+    
+    filters = {name: request.args[name] for name in ("Author", "Name", "user_id", "q") if request.args.get(name)}
+    counter = make_counter(strategy, Book.__tablename__, filters, current_app.config["COUNT_CACHE_TTL"])
         
     #pagination
-    page = request.args.get("page", 1, type=int)
-    limit = request.args.get("limit", 10, type=int)
-    paginated = query.paginate(page=page, per_page=limit, error_out=False)
     
-    books = [book.to_dict() for book in paginated.items]
+    response, status = paginate_query(query, Book.id, request.args, "books", lambda rows: books_to_dicts(rows, fields), count=counter, sort=sort)
+    
+    return jsonify(response), status
+
+#Export every book (or the filtered ones) as NDJSON or CSV in id order, streamed and gzipped when the client accepts it
+#after_id resumes an interrupted export after the last book received, the id is always part of the rows for that
+
+@book_bp.route("/export", methods=["GET"])
+@jwt_required()
+def export_all_books():
+    
+    claims = get_jwt()
+    
+    if claims["role"].lower() != "admin":
+        return jsonify({"Error": "Unauthorized Access"}), 403
+    
+    export_format = request.args.get("format", "ndjson")
     
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({"Error": "Validation Failed", "Details": {"format": "format must be ndjson or csv"}}), 400
     
-    return jsonify({
-        "page": page,
-        "limit": limit,
-        "total": paginated.total,
-        "total pages": paginated.pages,
-        "books": books
-    }), 200
+    try:
+        fields = parse_fields(request.args.get("fields"), BOOK_FIELDS) or list(BOOK_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
+    
+    if "id" not in fields:
+        fields.insert(0, "id")
+    
+    after_id = request.args.get("after_id", 0, type=int)
+    
+    query = filter_books(db.session.query(*book_columns(fields)), request.args).filter(Book.id > after_id)
+    
+    term = request.args.get("q")
+    
+    if term:
+        query = search_books(query, term, ranked=False)
+    
+    chunks = export_books(query.order_by(Book.id), export_format, fields)
+    headers = {"Content-Disposition": f"attachment; filename=books.{export_format}", "Vary": "Accept-Encoding"}
+    
+    if request.accept_encodings["gzip"]:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    
+    return Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[export_format], headers=headers), 200
 
-#Get a book by id
+
+#Get a book by id, answers 304 Not Modified when the client already has the current version
 
 @book_bp.route("/<int:book_id>", methods=["GET"])
 @jwt_required()
 def get_book(book_id):
     
-    requesting_user_id = int(get_jwt_identity())
-    requesting_user = User.query.get(requesting_user_id)
+    requesting_user_id = current_user.id
     claims = get_jwt()
     
-    if not requesting_user:
-        return jsonify({"Error": "User Not Found"}), 404
+    #sparse fieldsets, only the requested fields are selected
     
-    if claims["role"].lower() == "admin":
-        book = Book.query.get(book_id)
-        
-        if not book:
-            return jsonify({"Error": "Book Not Found"}), 404
-        
-        return jsonify(book.to_dict()), 200
+    try:
+        fields = parse_fields(request.args.get("fields"), BOOK_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
     
-    book = Book.query.get(book_id)
+    #only the owner and the version are read until the body is actually needed
     
-    if not book:
+    row = db.session.execute(select(Book.user_id, Book.version).where(Book.id == book_id)).first()
+    
+    if not row:
         return jsonify({"Error": "Book Not Found"}), 404
     
-    if requesting_user_id != book.user_id:
+    if claims["role"].lower() != "admin" and requesting_user_id != row.user_id:
         return jsonify({"Error": "Unauthorized Access"}), 403
     
-    return jsonify(book.to_dict()), 200
+    etag = variant_etag(book_etag(book_id, row.version), fields)
+    
+    if is_not_modified(etag):
+        return not_modified_response(etag)
+    
+    book = db.session.execute(select(*book_columns(fields)).where(Book.id == book_id)).first()
+    
+    return etag_response(books_to_dicts([book], fields)[0], etag)
     
     
 
 
-#update Name and Author of a book
+#same as GET /books?ids= for lists too long for a url, body is {"ids": [1, 2, 3]}
+
+@book_bp.route("/lookup", methods=["POST"])
+@jwt_required()
+def lookup_books_by_body():
+    data = request.get_json(silent=True)
+    ids = parse_id_array(data.get("ids")) if isinstance(data, dict) else None
+    
+    if not ids:
+        return jsonify({"Error": "Validation Failed", "Details": {"ids": "ids must be a list of book ids"}}), 400
+    
+    return lookup_books(ids)
+
+
+#update Name and Author of a book, If-Match makes the update conditional
 
 @book_bp.route("/<int:book_id>", methods=["PUT"])
 @jwt_required()
 def update_book(book_id):
-    requesting_user_id = int(get_jwt_identity())
-    requesting_user = User.query.get(requesting_user_id)
+    requesting_user_id = current_user.id
     
-    if not requesting_user:
-        return jsonify({"Error": "User Not Found"}), 404
-    
-    book = Book.query.get(book_id)
+    book = db.session.get(Book, book_id)
     
     if not book:
         return jsonify({"Error": "Book Not Found"}), 404
@@ -149,6 +302,9 @@ def update_book(book_id):
     if book.user_id != requesting_user_id:
         return jsonify({"Error": "Unauthorized Access"}), 403
     
+    if precondition_failed(book_etag(book.id, book.version)):
+        return precondition_failed_response()
+    
     data = request.get_json()
     errors = validate_book_update(data)
     
@@ -158,44 +314,134 @@ def update_book(book_id):
     book.Name = data.get("Name", book.Name)
     book.Author = data.get("Author", book.Author)
     
+    record_changes("book", "update", [book.id])
+    bump_books_versions([book.user_id])
     db.session.commit()
+    invalidate_responses("books")
             
-    return jsonify({"Message": "Book Details Updated Successfully", "Details": book.to_dict()}), 200
+    return etag_response({"Message": "Book Details Updated Successfully", "Details": book.to_dict()}, book_etag(book.id, book.version))
 
 
-#delete a book by it's id        
+#delete a book by it's id, If-Match makes the delete conditional
     
 
 @book_bp.route("/<int:book_id>", methods=["DELETE"])
 @jwt_required()
 def delete_book(book_id):
-    requesting_user_id = int(get_jwt_identity())
-    requesting_user = User.query.get(requesting_user_id)
+    requesting_user_id = current_user.id
     claims = get_jwt()
     
-    if not requesting_user:
-        return jsonify({"Error": "User Not Found"}), 404
-    
-    if claims["role"].lower() == "admin":
-        book = Book.query.get(book_id)
-        
-        if not book:
-            return jsonify({"Error": "Book Not Found"}), 404
-        
-        db.session.delete(book)
-        db.session.commit()
-        
-        return jsonify({"Message": f"Book with book id {book_id} deleted successfully"}), 200
-    
-    book = Book.query.get(book_id)
+    book = db.session.get(Book, book_id)
     
     if not book:
         return jsonify({"Error": "Book Not Found"}), 404
     
-    if requesting_user_id != book.user_id:
+    if claims["role"].lower() != "admin" and requesting_user_id != book.user_id:
         return jsonify({"Error": "Unauthorized Access"}), 403
     
+    if precondition_failed(book_etag(book.id, book.version)):
+        return precondition_failed_response()
+    
     db.session.delete(book)
+    record_changes("book", "delete", [book_id])
+    bump_books_versions([book.user_id])
     db.session.commit()
+    invalidate_responses("books")
+    
+    return jsonify({"Message": f"Book with book id {book_id} deleted successfully"}), 200
+
+
+#update Name and Author of many books, body is a list of {"id", "Name", "Author"}
+#only the owner can update a book, same as update_book
+
+@book_bp.route("/", methods=["PATCH"])
+@jwt_required()
+def update_books():
+    requesting_user_id = current_user.id
+    
+    data = request.get_json(silent=True)
+    
+    if not isinstance(data, list) or not data:
+        return jsonify({"Error": "Validation Failed", "Details": {"data": "A list of books is required"}}), 400
+    
+    if len(data) > current_app.config["BULK_MAX_ITEMS"]:
+        return jsonify({"Error": "Validation Failed", "Details": {"data": f"At most {current_app.config['BULK_MAX_ITEMS']} books can be updated at once"}}), 400
+    
+    failed = []
+    changes = {}
+    
+    for index, item in enumerate(data):
+        if not isinstance(item, dict) or not is_valid_id(item.get("id")):
+            failed.append({"index": index, "Details": {"id": "A valid book id is required"}})
+            continue
+        
+        fields = {key: item[key] for key in ("Name", "Author") if key in item}
+        errors = validate_book_update(fields)
+        
+        if errors:
+            failed.append({"index": index, "Details": errors})
+            continue
+        
+        changes.setdefault(item["id"], {}).update(fields)
+        
+    owners = dict(db.session.execute(select(Book.id, Book.user_id).where(Book.id.in_(changes))).all()) if changes else {}
+    
+    missing = [book_id for book_id in changes if book_id not in owners]
+    forbidden = [book_id for book_id in changes if book_id in owners and owners[book_id] != requesting_user_id]
+    updated = [book_id for book_id in changes if owners.get(book_id) == requesting_user_id]
+    
+    #one executemany UPDATE for all the allowed books, missing fields keep their value and the version is bumped
+    
+    if updated:
+        table = Book.__table__
+        statement = (update(table)
+                     .where(table.c.id == bindparam("book_id"))
+                     .values(Name=func.coalesce(bindparam("new_name"), table.c.Name),
+                             Author=func.coalesce(bindparam("new_author"), table.c.Author),
+                             version=table.c.version + 1))
+        
+        db.session.execute(statement, [{"book_id": book_id,
+                                        "new_name": changes[book_id].get("Name"),
+                                        "new_author": changes[book_id].get("Author")} for book_id in updated])
+        record_changes("book", "update", updated)
+        bump_books_versions([requesting_user_id])
+        db.session.commit()
+        invalidate_responses("books")
+    
+    return jsonify({"updated": updated, "forbidden": forbidden, "missing": missing, "failed": failed}), 200
+
+
+#delete many books, ids are passed as ?ids=1,2,3
+#admin can delete any book, a user only their own books, same as delete_book
+
+@book_bp.route("/", methods=["DELETE"])
+@jwt_required()
+def delete_books():
+    requesting_user_id = current_user.id
+    claims = get_jwt()
+    
+    ids = parse_id_list(request.args.get("ids", ""))
+    
+    if not ids:
+        return jsonify({"Error": "Validation Failed", "Details": {"ids": "ids must be a comma separated list of book ids"}}), 400
+    
+    if len(ids) > current_app.config["BULK_MAX_ITEMS"]:
+        return jsonify({"Error": "Validation Failed", "Details": {"ids": f"At most {current_app.config['BULK_MAX_ITEMS']} books can be deleted at once"}}), 400
+    
+    owners = dict(db.session.execute(select(Book.id, Book.user_id).where(Book.id.in_(ids))).all())
+    is_admin = claims["role"].lower() == "admin"
+    
+    missing = [book_id for book_id in ids if book_id not in owners]
+    forbidden = [book_id for book_id in ids if book_id in owners and not is_admin and owners[book_id] != requesting_user_id]
+    deleted = [book_id for book_id in ids if book_id in owners and (is_admin or owners[book_id] == requesting_user_id)]
+    
+    #one set based DELETE for all the allowed books
+    
+    if deleted:
+        db.session.execute(delete(Book).where(Book.id.in_(deleted)), execution_options={"synchronize_session": False})
+        record_changes("book", "delete", deleted)
+        bump_books_versions([owners[book_id] for book_id in deleted])
+        db.session.commit()
+        invalidate_responses("books")
     
-    return jsonify({"Message": f"Book with book id {book_id} deleted succesfully"}), 200
\ No newline at end of file
+    return jsonify({"deleted": deleted, "forbidden": forbidden, "missing": missing}), 200
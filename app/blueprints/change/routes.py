@@ -0,0 +1,131 @@
+from datetime import timedelta
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt
+from sqlalchemy import func, select
+from app import db
+from app.changes import ENTITIES, utcnow
+from app.models.book import Book
+from app.models.change import Change
+from app.models.user import User
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor
+from app.serialization import USER_FIELDS, book_columns, books_to_dicts, rows_by_id, user_columns, users_to_dicts
+
+#Creating changes Blueprint
+
+change_bp = Blueprint("changes", __name__)
+
+CHANGES_MAX_LIMIT = 1000
+
+#user records of the feed leave out "books", which book belongs to whom is in the user_id of the book records
+
+FEED_USER_FIELDS = [field for field in USER_FIELDS if field != "books"]
+
+
+#since tokens are opaque to clients like the cursors, they carry the id of the last change read
+
+def feed_token(change_id):
+    return encode_cursor({"id": change_id})
+
+
+#method to collapse the changes of a page to the last one per row, a row inserted and then updated stays an insert
+
+def compact_changes(rows):
+    latest = {}
+    
+    for row in rows:
+        key = (row.entity, row.entity_id)
+        previous = latest.pop(key, None)
+        operation = row.operation
+        
+        if previous and previous["operation"] == "insert" and operation == "update":
+            operation = "insert"
+        
+        latest[key] = {"entity": row.entity, "id": row.entity_id, "operation": operation, "changed_at": row.changed_at.isoformat() + "Z"}
+        
+    return list(latest.values())
+
+
+#method to add the current data of the inserted / updated rows, one IN query per entity
+#a row deleted since then is sent as a tombstone right away, its own delete follows later in the feed
+
+def add_current_data(changes):
+    ids = {entity: [change["id"] for change in changes if change["entity"] == entity and change["operation"] != "delete"] for entity in ENTITIES}
+    rows = {
+        "book": rows_by_id(book_columns(), Book.id, ids["book"]),
+        "user": rows_by_id(user_columns(FEED_USER_FIELDS), User.id, ids["user"]),
+    }
+    
+    for change in changes:
+        row = rows[change["entity"]].get(change["id"])
+        
+        if row is None:
+            change["operation"] = "delete"
+            change["data"] = None
+        elif change["entity"] == "book":
+            change["data"] = books_to_dicts([row])[0]
+        else:
+            change["data"] = users_to_dicts([row], FEED_USER_FIELDS)[0]
+            
+    return changes
+
+
+#--------- API CHANGES ENDPOINTS ------------
+
+#Incremental change feed of books and users, for clients keeping a copy of the data in sync
+#returns the inserts, updates and deletes after the since token in the order they happened, with the current data
+#of every row, and the token to pass next time. A sync costs as much as the churn since the last one, not the table size
+#since=latest returns the current token only: take it, export the data (GET /books/export), then follow the feed
+
+@change_bp.route("/changes", methods=["GET"])
+@jwt_required()
+def get_changes():
+    
+    claims = get_jwt()
+    
+    if claims["role"].lower() != "admin":
+        return jsonify({"Error": "Unauthorized Access"}), 403
+    
+    limit = request.args.get("limit", 100, type=int)
+    
+    if limit < 1 or limit > CHANGES_MAX_LIMIT:
+        return jsonify({"Error": "Validation Failed", "Details": {"limit": f"limit must be between 1 and {CHANGES_MAX_LIMIT}"}}), 400
+    
+    entity = request.args.get("entity")
+    
+    if entity is not None and entity not in ENTITIES:
+        return jsonify({"Error": "Validation Failed", "Details": {"entity": "entity must be book or user"}}), 400
+    
+    since = request.args.get("since", "")
+    
+    if since == "latest":
+        latest = db.session.scalar(select(func.max(Change.id))) or 0
+        return jsonify({"changes": [], "next_since": feed_token(latest), "has_more": False}), 200
+    
+    try:
+        since_id = decode_cursor(since)["id"] if since else 0
+    except InvalidCursor:
+        return jsonify({"Error": "Validation Failed", "Details": {"since": "Invalid since token"}}), 400
+    
+    query = select(Change.id, Change.entity, Change.entity_id, Change.operation, Change.changed_at).where(Change.id > since_id)
+    
+    if entity:
+        query = query.where(Change.entity == entity)
+    
+    rows = db.session.execute(query.order_by(Change.id).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    #ids are handed out before commit, so a slow transaction can commit a change below ids that are already visible
+    #the page stops at the first change younger than CHANGES_SETTLE_SECONDS, so such a change is not skipped
+    
+    settled = utcnow() - timedelta(seconds=current_app.config["CHANGES_SETTLE_SECONDS"])
+    
+    for index, row in enumerate(rows):
+        if row.changed_at > settled:
+            rows = rows[:index]
+            has_more = True
+            break
+    
+    next_since = feed_token(rows[-1].id) if rows else feed_token(since_id)
+    
+    return jsonify({"changes": add_current_data(compact_changes(rows)), "next_since": next_since, "has_more": has_more}), 200
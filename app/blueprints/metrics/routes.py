@@ -0,0 +1,14 @@
+from flask import Blueprint, Response
+from app.instrumentation import instrumentation
+
+#Creating metrics Blueprint
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+#per endpoint latency histograms and SQL counters in the Prometheus text format
+#not behind a JWT so Prometheus can scrape it, keep it off the public network at the proxy
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(instrumentation.render_metrics(), mimetype="text/plain; version=0.0.4")
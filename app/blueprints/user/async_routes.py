@@ -0,0 +1,90 @@
+from collections import defaultdict
+from flask import jsonify, request
+from sqlalchemy import select
+from app.asgi import AsyncBlueprint
+from app.models.user import User
+from app.models.book import Book
+from app.conditional import etag_response, format_user_books_etag, format_user_etag, is_not_modified, not_modified_response, user_etag_statement, variant_etag
+from app.serialization import BOOK_FIELDS, USER_FIELDS, InvalidFields, book_columns, book_ids_statements, books_to_dicts, parse_fields, user_columns, users_to_dicts
+
+#async versions of the user read endpoints, served by the ASGI app with the same contract as routes.py
+
+user_async_bp = AsyncBlueprint("users")
+
+
+async def user_etag(session, user_id, format_etag=format_user_etag):
+    row = (await session.execute(user_etag_statement(user_id))).first()
+    return format_etag(user_id, row)
+
+
+async def book_ids_by_user(session, user_ids):
+    book_ids = defaultdict(list)
+
+    for statement in book_ids_statements(user_ids):
+        for user_id, book_id in await session.execute(statement):
+            book_ids[user_id].append(book_id)
+
+    return book_ids
+
+
+#Get an user by id
+
+@user_async_bp.route("/<int:user_id>")
+async def get_user(session, requesting_user_id, claims, user_id):
+
+    #if a user is not admin and is requesting details of other user block that
+
+    if claims["role"].lower() != "admin" and requesting_user_id != user_id:
+        return jsonify({"Error": "Unauthorized Access"}), 403
+
+    #sparse fieldsets, only the requested fields are selected
+
+    try:
+        fields = parse_fields(request.args.get("fields"), USER_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
+
+    etag = await user_etag(session, user_id)
+
+    if not etag:
+        return jsonify({"Error": "User Not Found"}), 404
+
+    etag = variant_etag(etag, fields)
+
+    if is_not_modified(etag):
+        return not_modified_response(etag)
+
+    requested_user = (await session.execute(select(*user_columns(fields)).where(User.id == user_id))).first()
+    book_ids = await book_ids_by_user(session, [user_id]) if "books" in (fields or USER_FIELDS) else {}
+
+    return etag_response(users_to_dicts([requested_user], fields, book_ids)[0], etag)
+
+
+#Get all the books owned by a user
+
+@user_async_bp.route("/<int:user_id>/books")
+async def get_user_books(session, requesting_user_id, claims, user_id):
+
+    if claims["role"].lower() != "admin" and requesting_user_id != user_id:
+        return jsonify({"Error": "Unauthorized Access"}), 403
+
+    #sparse fieldsets, only the requested fields are selected
+
+    try:
+        fields = parse_fields(request.args.get("fields"), BOOK_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
+
+    etag = await user_etag(session, user_id, format_user_books_etag)
+
+    if not etag:
+        return jsonify({"Error": "User Not Found"}), 404
+
+    etag = variant_etag(etag, fields)
+
+    if is_not_modified(etag):
+        return not_modified_response(etag)
+
+    books = (await session.execute(select(*book_columns(fields)).where(Book.user_id == user_id))).all()
+
+    return etag_response(books_to_dicts(books, fields), etag)
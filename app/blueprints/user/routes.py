@@ -1,10 +1,17 @@
-import re
-from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+import json
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt, current_user
+from sqlalchemy import func, insert, select
 from app import db
 from app.models.user import User
 from app.models.book import Book
-from email_validator import validate_email, EmailNotValidError
+from app.changes import record_changes, record_changes_where
+from app.conditional import bump_books_versions, etag_response, format_user_books_etag, is_not_modified, not_modified_response, precondition_failed, precondition_failed_response, user_etag, user_precondition_failed, variant_etag
+from app.identity import invalidate_identity
+from app.pagination import paginate_query
+from app.response_cache import cached_response, invalidate_responses
+from app.serialization import BOOK_FIELDS, USER_FIELDS, InvalidFields, book_columns, books_to_dicts, parse_fields, rows_by_id, user_columns, users_to_dicts
+from app.validation import parse_id_array, parse_id_list, validate_book_create, validate_user_update
 
 
 #Creating user Blueprint
@@ -12,99 +19,95 @@ from email_validator import validate_email, EmailNotValidError
 user_bp = Blueprint("users", __name__)
 
 
-#--------- USER VALIDATION HELPERS ---------
+#--------- STREAMING HELPERS ------------
 
-#method to validate a password
+STREAM_MIMETYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+STREAM_BATCH_SIZE = 500
 
-def validate_password(password):
-    #rules: min 8 chars, at least 1 uppercase, 1 lowercase, 1 digit, 1 special char
-    pattern = r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&])[A-Za-z\d@$!%*?&]{8,}$'
+#method to serialize users batch by batch, either as one json array or as one json document per line
+#batches are read with keyset pagination (id > last id) and fully fetched, so no cursor stays open
+#while the book ids of a batch are queried on the same connection (MySQL cannot run both at once)
 
-    if re.match(pattern, password):
-        return True
+def keyset_batches(query, id_column, batch_size):
+    last_id = None
     
-    return False
+    while True:
+        batch = query.filter(id_column > last_id) if last_id is not None else query
+        rows = batch.order_by(id_column).limit(batch_size).all()
+        
+        if rows:
+            yield rows
+        
+        if len(rows) < batch_size:
+            return
+        
+        last_id = rows[-1].id
 
-#method to validate user update information
 
-def validate_user_update(data):
-    errors = {}
-    
-    name_pattern = re.compile(r"^[A-Za-z ]+$")
+def stream_users(query, stream_format, fields=None):
+    dumps = current_app.json.dumps
+    first = True
     
-    if not data:
-        errors["data"] = "User data is required"
-        return errors
+    if stream_format == "json":
+        yield "["
     
-    #first_name
-    if "first_name" in data:
-        if not data["first_name"]:
-            errors["first_name"] = "First name is required"
-            
-        elif not name_pattern.match(data["first_name"]):
-            errors["first_name"] = "First name should only contain alphabets and spaces"
-        
-    #last_name
-    if "last_name" in data:
-        if not data["last_name"]:
-            errors["last_name"] = "Last name is required"
-            
-        elif not name_pattern.match(data["last_name"]):
-            errors["last_name"] = "Last name should only contain alphabets and spaces"
-        
-    #email
-    if "email_id" in data:
-        if not data["email_id"]:
-            errors["email_id"] = "email id is required"
+    for rows in keyset_batches(query, User.id, STREAM_BATCH_SIZE):
+        users = users_to_dicts(rows, fields)
         
+        if stream_format == "ndjson":
+            yield "".join(dumps(user) + "\n" for user in users)
         else:
-            try:
-                validate_email(data["email_id"])
-            except EmailNotValidError as e:
-                errors["email_id"] = str(e)
-                
-    if "password" in data:
-        if not data["password"]:
-            errors["password"] = "Password is required"
+            yield ("" if first else ",") + ",".join(dumps(user) for user in users)
+            
+        first = False
+    
+    if stream_format == "json":
+        yield "]"
+
+
+#method to read an NDJSON body, lines that are not valid json are kept as None so they fail validation
+
+def read_ndjson(stream):
+    items = []
+    
+    for line in stream:
+        line = line.strip()
         
-        elif not validate_password(data["password"]):
-            errors["password"] = "password must contain min 8 chars, at least 1 uppercase, 1 lowercase, 1 digit, 1 special char"
+        if not line:
+            continue
         
-    return errors
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(None)
+            
+    return items
 
 
-#method to validate a book
+#--------- LOOKUP HELPERS ------------
 
-def validate_book_create(data):
-    
-    errors = {}
-    
-    name_pattern = re.compile(r"^[A-Za-z ]+$")
-    
-    if not data:
-        errors["data"] = "Book data is required"
-        return errors
+#method to resolve many user ids at once, every user is checked like in get_user
+#admin gets any user and the ids that don't exist as missing, a user only themselves and every other id
+#as forbidden so that a user can't find out which ids exist
+
+def lookup_users(ids):
+    try:
+        fields = parse_fields(request.args.get("fields"), USER_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
     
-    #Name
+    if len(ids) > current_app.config["BULK_MAX_ITEMS"]:
+        return jsonify({"Error": "Validation Failed", "Details": {"ids": f"At most {current_app.config['BULK_MAX_ITEMS']} users can be fetched at once"}}), 400
     
-    if "Name" not in data or not data["Name"]:
-        errors["Name"] = "Book name is required"
-        
-    elif len(data["Name"]) < 2:
-        errors["Name"] = "Book name must be atleast 2 characters long"
+    users = rows_by_id(user_columns(fields), User.id, ids)
+    is_admin = get_jwt()["role"].lower() == "admin"
+    requesting_user_id = current_user.id
     
-    elif len(data["Name"]) > 255:
-        errors["Name"] = "Book name must not exceed 255 characters"
-        
-    #Author
+    found = [users[user_id] for user_id in ids if user_id in users and (is_admin or user_id == requesting_user_id)]
+    forbidden = [user_id for user_id in ids if not is_admin and user_id != requesting_user_id]
+    missing = [user_id for user_id in ids if user_id not in users and (is_admin or user_id == requesting_user_id)]
     
-    if "Author" not in data or not data["Author"]:
-        errors["Author"] = "Author name is required"
-        
-    elif not name_pattern.match(data["Author"]):
-        errors["Author"] = "Author name must contain only alphabets and spaces"
-        
-    return errors
+    return jsonify({"found": users_to_dicts(found, fields), "forbidden": forbidden, "missing": missing}), 200
 
 
 #--------- API USER ENDPOINTS ------------
@@ -113,25 +116,64 @@ def validate_book_create(data):
 
 @user_bp.route("/", methods=["GET"])
 @jwt_required()
+@cached_response("users", "books")
 def get_users():
     
-    #get the user who requested the endpoint
-    
-    requesting_user_id = int(get_jwt_identity())
     claims = get_jwt()
     
-    requesting_user = User.query.get(requesting_user_id)
+    #?ids=1,2,3 fetches those users only, open to users since each user is checked
     
-    if not requesting_user:
-        return jsonify({"Error": "User not Found"}), 404
+    if "ids" in request.args:
+        ids = parse_id_list(request.args["ids"])
+        
+        if not ids:
+            return jsonify({"Error": "Validation Failed", "Details": {"ids": "ids must be a comma separated list of user ids"}}), 400
+        
+        return lookup_users(ids)
     
     if claims["role"].lower() != "admin":
         return jsonify({"Error": "Unauthorized Access"}), 403
     
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    #sparse fieldsets, only the requested fields are selected
+    
+    try:
+        fields = parse_fields(request.args.get("fields"), USER_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
+    
+    #only the serialized columns are selected, book ids of a page are loaded with one extra query
+    
+    query = db.session.query(*user_columns(fields))
+    
+    #filtering
+    
+    role = request.args.get("role")
+    email_prefix = request.args.get("email_id")
+    
+    if role:
+        query = query.filter(User.role == role.lower())
+    if email_prefix:
+        query = query.filter(User.email_id.startswith(email_prefix.lower(), autoescape=True))
+    
+    #streaming of every matching user, rows are read in batches of STREAM_BATCH_SIZE in id order
+    
+    stream_format = request.args.get("stream")
+    
+    if stream_format:
+        if stream_format not in STREAM_MIMETYPES:
+            return jsonify({"Error": "Validation Failed", "Details": {"stream": "stream must be json or ndjson"}}), 400
+        
+        rows = stream_users(query, stream_format, fields)
+        return Response(stream_with_context(rows), mimetype=STREAM_MIMETYPES[stream_format]), 200
+    
+    #pagination
+    
+    response, status = paginate_query(query, User.id, request.args, "users", lambda rows: users_to_dicts(rows, fields))
+    
+    return jsonify(response), status
 
 #Get an user by id, protected route user must have a jwt token to access this route
+#answers 304 Not Modified when the client already has the current version
 
 @user_bp.route("/<int:user_id>", methods=["GET"])
 @jwt_required()
@@ -139,32 +181,47 @@ def get_user(user_id):
     
     #get the user who requested the endpoint
     
-    requesting_user_id = int(get_jwt_identity())
+    requesting_user = current_user
     claims = get_jwt()
     
-    requesting_user = User.query.get(requesting_user_id)
+    #if a user is not admin and is requesting details of other user block that
+    
+    if claims["role"].lower() != "admin" and requesting_user.id != user_id:
+        return jsonify({"Error": "Unauthorized Access"}), 403
+    
+    #sparse fieldsets, only the requested fields are selected
     
-    if not requesting_user:
+    try:
+        fields = parse_fields(request.args.get("fields"), USER_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
+    
+    etag = user_etag(user_id)
+    
+    if not etag:
         return jsonify({"Error": "User Not Found"}), 404
     
-    #if requesting user is admin then provide the user info
+    etag = variant_etag(etag, fields)
     
-    if claims["role"].lower() == "admin":
-        requested_user = User.query.get(user_id)
-        
-        if not requested_user:
-            return jsonify({"Error": "User Not Found"}), 404
-        
-        return jsonify(requested_user.to_dict()), 200
+    if is_not_modified(etag):
+        return not_modified_response(etag)
     
-    #if a user is not admin and is requesting details of other user block that
+    requested_user = db.session.execute(select(*user_columns(fields)).where(User.id == user_id)).first()
     
-    if requesting_user.id != user_id:
-        return jsonify({"Error": "Unauthorized Access"}), 403
+    return etag_response(users_to_dicts([requested_user], fields)[0], etag)
+
+#same as GET /users?ids= for lists too long for a url, body is {"ids": [1, 2, 3]}
+
+@user_bp.route("/lookup", methods=["POST"])
+@jwt_required()
+def lookup_users_by_body():
+    data = request.get_json(silent=True)
+    ids = parse_id_array(data.get("ids")) if isinstance(data, dict) else None
     
-    #if a user is requesting is own details then retur the details
+    if not ids:
+        return jsonify({"Error": "Validation Failed", "Details": {"ids": "ids must be a list of user ids"}}), 400
     
-    return jsonify(requesting_user.to_dict()), 200
+    return lookup_users(ids)
 
 #Add a book to a user
 
@@ -172,12 +229,7 @@ def get_user(user_id):
 @jwt_required()
 def add_book_to_user(user_id):
     
-    requesting_user_id = int(get_jwt_identity())
-    
-    requesting_user = User.query.get(requesting_user_id)
-    
-    if not requesting_user:
-        return jsonify({"Error": "User not Found"}), 404
+    requesting_user_id = current_user.id
     
     if requesting_user_id != user_id:
         return jsonify({"Error": "Unauthorized Access"}), 403
@@ -191,53 +243,143 @@ def add_book_to_user(user_id):
 
     book = Book(Name=data["Name"], Author=data["Author"], user_id=user_id)
     db.session.add(book)
+    db.session.flush()
+    record_changes("book", "insert", [book.id])
+    bump_books_versions([user_id])
     db.session.commit()
+    invalidate_responses("books")
     
     return jsonify(book.to_dict()), 201
 
 
-#Get all the books owned by a user
+#Add many books to a user in one request, body is a json array or NDJSON (one book per line)
+#valid books are inserted in batches, invalid ones are reported per item
+
+@user_bp.route("/<int:user_id>/books/bulk", methods=["POST"])
+@jwt_required()
+def add_books_to_user(user_id):
+    
+    requesting_user_id = current_user.id
+    
+    if requesting_user_id != user_id:
+        return jsonify({"Error": "Unauthorized Access"}), 403
+    
+    if request.mimetype == "application/x-ndjson":
+        items = read_ndjson(request.stream)
+    else:
+        items = request.get_json(silent=True)
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({"Error": "Validation failed", "Details": {"data": "A list of books is required"}}), 400
+    
+    if len(items) > current_app.config["BULK_MAX_ITEMS"]:
+        return jsonify({"Error": "Validation failed", "Details": {"data": f"At most {current_app.config['BULK_MAX_ITEMS']} books can be added at once"}}), 400
+    
+    results = []
+    rows = []
+    
+    for index, item in enumerate(items):
+        errors = validate_book_create(item) if isinstance(item, dict) else {"data": "Book data is required"}
+        
+        if errors:
+            results.append({"index": index, "status": "failed", "Details": errors})
+            continue
+        
+        result = {"index": index, "status": "created"}
+        results.append(result)
+        rows.append((result, {"Name": item["Name"], "Author": item["Author"], "user_id": user_id}))
+    
+    #one multi row INSERT per chunk, where the database has RETURNING (SQLite, PostgreSQL) the sentinel column
+    #of Book lets the ids come back in the order of the rows from that same statement,
+    #MySQL has no RETURNING so the results have no id there
+    
+    chunk_size = current_app.config["BULK_CHUNK_SIZE"]
+    returning = db.session.get_bind().dialect.insert_executemany_returning
+    
+    #without RETURNING the new books are logged as the books of the user above the highest id they had before
+    
+    last_id = None if returning else (db.session.scalar(select(func.max(Book.id)).where(Book.user_id == user_id)) or 0)
+    
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        values = [row for _, row in chunk]
+        
+        if returning:
+            book_ids = db.session.scalars(insert(Book).returning(Book.id, sort_by_parameter_order=True), values)
+            
+            for (result, _), book_id in zip(chunk, book_ids):
+                result["id"] = book_id
+        else:
+            db.session.execute(insert(Book), values)
+    
+    if returning:
+        record_changes("book", "insert", [result["id"] for result, _ in rows])
+    elif rows:
+        record_changes_where("book", "insert", Book.id, Book.user_id == user_id, Book.id > last_id)
+    
+    if rows:
+        bump_books_versions([user_id])
+            
+    db.session.commit()
+    invalidate_responses("books")
+    
+    status = 201 if rows else 400
+    
+    return jsonify({"created": len(rows), "failed": len(results) - len(rows), "results": results}), status
+
+
+#Get all the books owned by a user, answers 304 Not Modified when nothing changed
 
 @user_bp.route("/<int:user_id>/books", methods=["GET"])
 @jwt_required()
 def get_user_books(user_id):
-    requesting_user_id = int(get_jwt_identity())
+    requesting_user_id = current_user.id
     claims = get_jwt()
     
-    requesting_user = User.query.get(requesting_user_id)
+    if claims["role"].lower() != "admin" and requesting_user_id != user_id:
+        return jsonify({"Error": "Unauthorized Access"}), 403
     
+    #sparse fieldsets, only the requested fields are selected
     
-    if not requesting_user:
+    try:
+        fields = parse_fields(request.args.get("fields"), BOOK_FIELDS)
+    except InvalidFields as e:
+        return jsonify({"Error": "Validation Failed", "Details": {"fields": str(e)}}), 400
+    
+    etag = user_etag(user_id, format_user_books_etag)
+    
+    if not etag:
         return jsonify({"Error": "User Not Found"}), 404
     
-    if claims["role"].lower() == "admin":
-        requested_user = User.query.get(user_id)
-        
-        if not requested_user:
-            return jsonify({"Error": "User Not Found"}), 404
-        
-        return jsonify([book.to_dict() for book in requested_user.books])
+    etag = variant_etag(etag, fields)
     
-    if requesting_user_id != user_id:
-        return jsonify({"Error": "Unauthorized Access"}), 403
+    if is_not_modified(etag):
+        return not_modified_response(etag)
     
-    return jsonify([book.to_dict() for book in requesting_user.books]), 200
+    books = db.session.query(*book_columns(fields)).filter(Book.user_id == user_id).all()
+    
+    return etag_response(books_to_dicts(books, fields), etag)
 
-#update user details
+#update user details, If-Match makes the update conditional on the user version (changes of their books don't count)
 
 @user_bp.route("/<int:user_id>", methods=["PUT"])
 @jwt_required()
 def update_user(user_id):
-    requesting_user_id = int(get_jwt_identity())
+    requesting_user_id = current_user.id
+    
+    if requesting_user_id != user_id:
+        return jsonify({"Error": "Unauthorized Access"}), 403
+    
+    if user_precondition_failed(user_id):
+        return precondition_failed_response()
     
-    requesting_user = User.query.get(requesting_user_id)
+    #current_user can be a cached copy, the update is made on the row as it is now
+    
+    requesting_user = db.session.get(User, user_id, populate_existing=True)
     
     if not requesting_user:
         return jsonify({"Error": "User Not Found"}), 404
     
-    if requesting_user_id != user_id:
-        return jsonify({"Error": "Unauthorized Access"}), 403
-    
     data = request.get_json()
     
     errors = validate_user_update(data)
@@ -251,38 +393,39 @@ def update_user(user_id):
     if "password" in data:
         requesting_user.set_password(data["password"])
     
+    record_changes("user", "update", [user_id])
     db.session.commit()
+    invalidate_responses("users")
+    invalidate_identity(user_id)
     
-    return jsonify({"message": "User Details Updated Successfully", "Details": requesting_user.to_dict()}), 200
+    return etag_response({"message": "User Details Updated Successfully", "Details": requesting_user.to_dict()}, user_etag(user_id))
 
-#Delete a user
+#Delete a user, If-Match makes the delete conditional
 
 @user_bp.route("/<int:user_id>", methods=["DELETE"])
 @jwt_required()
 def delete_user(user_id):
-    requesting_user_id = int(get_jwt_identity())
+    requesting_user_id = current_user.id
     claims = get_jwt()
     
-    requesting_user = User.query.get(requesting_user_id)
+    if claims["role"].lower() != "admin" and requesting_user_id != user_id:
+        return jsonify({"Error": "Unauthorized Access"}), 403
+    
+    etag = user_etag(user_id)
     
-    if not requesting_user:
+    if not etag:
         return jsonify({"Error": "User Not Found"}), 404
     
-    if claims["role"].lower() == "admin":
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({"Error": "User Not Found"}), 404
-        
-        db.session.delete(user)
-        db.session.commit()
-        
-        return jsonify({"Message": f"User with user id {user_id} is deleted successfully"}), 200
+    if precondition_failed(etag):
+        return precondition_failed_response()
     
-    if requesting_user_id != user_id:
-        return jsonify({"Error": "Unauthorized Access"}), 403
+    #the books go with the user (ON DELETE CASCADE), they get their tombstones before they are gone
     
-    db.session.delete(requesting_user)
+    record_changes_where("book", "delete", Book.id, Book.user_id == user_id)
+    record_changes("user", "delete", [user_id])
+    db.session.delete(db.session.get(User, user_id, populate_existing=True))
     db.session.commit()
+    invalidate_responses("users", "books")
+    invalidate_identity(user_id)
     
-    return jsonify({"Message": f"User with user id {requesting_user_id} is deleted successfully"}), 200
\ No newline at end of file
+    return jsonify({"Message": f"User with user id {user_id} is deleted successfully"}), 200
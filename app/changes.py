@@ -0,0 +1,37 @@
+from datetime import datetime, timezone
+from sqlalchemy import insert, literal, select
+from app import db
+from app.models.change import Change
+
+#Helpers writing the change log read by GET /changes
+#the rows are added in the transaction of the write itself, so a change becomes visible together with
+#the data it points to and a rolled back write leaves nothing in the log
+
+ENTITIES = ("book", "user")
+
+OPERATIONS = ("insert", "update", "delete")
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+#method to log a change of many rows of one entity with one executemany INSERT
+
+def record_changes(entity, operation, ids):
+    if not ids:
+        return
+
+    changed_at = utcnow()
+
+    db.session.execute(insert(Change), [{"entity": entity, "entity_id": entity_id, "operation": operation, "changed_at": changed_at}
+                                        for entity_id in ids])
+
+
+#method to log a change of the rows matching conditions with one INSERT ... SELECT, the ids are never loaded
+#e.g. the books of a deleted user, or the books of a bulk insert on databases without RETURNING
+
+def record_changes_where(entity, operation, id_column, *conditions):
+    rows = select(literal(entity), id_column, literal(operation), literal(utcnow(), Change.changed_at.type)).where(*conditions)
+
+    db.session.execute(insert(Change).from_select(["entity", "entity_id", "operation", "changed_at"], rows))
@@ -0,0 +1,102 @@
+from flask import Response, jsonify, request
+from sqlalchemy import select, update
+from app import db
+from app.models.user import User
+
+#Helpers for conditional requests
+#ETags are built from the row versions so they can be checked without loading the full objects
+
+
+def book_etag(book_id, version):
+    return f"book-{book_id}-{version}"
+
+
+#a user representation also lists the ids of their books, so every insert, update or delete of a book
+#bumps the books_version of its owner, the user ETag has both versions and the ETag of the books of a user
+#only the books_version
+#the statement and the formatting are split so the async handlers can run the same query
+
+def user_etag_statement(user_id):
+    return select(User.version, User.books_version).where(User.id == user_id)
+
+
+#the format methods return None when the user does not exist
+
+def format_user_etag(user_id, row):
+    if row is None:
+        return None
+
+    return f"user-{user_id}-{row.version}-{row.books_version}"
+
+
+def format_user_books_etag(user_id, row):
+    if row is None:
+        return None
+
+    return f"user-books-{user_id}-{row.books_version}"
+
+
+def user_etag(user_id, format_etag=format_user_etag):
+    return format_etag(user_id, db.session.execute(user_etag_statement(user_id)).first())
+
+
+#method to bump the books_version of the owners of changed books, in the transaction of the book write
+#it is not the version_id_col, so a user update running at the same time doesn't fail with a conflict
+
+def bump_books_versions(user_ids):
+    user_ids = sorted(set(user_ids))
+
+    if user_ids:
+        db.session.execute(update(User).where(User.id.in_(user_ids)).values(books_version=User.books_version + 1),
+                           execution_options={"synchronize_session": False})
+
+
+#a response limited with fields= is a different representation, so it gets its own ETag
+
+def variant_etag(etag, fields):
+    return f"{etag}-{'.'.join(fields)}" if fields else etag
+
+
+#If-None-Match on reads, the weak comparison is used as the spec requires
+
+def is_not_modified(etag):
+    return request.if_none_match.contains_weak(etag)
+
+
+#If-Match on writes, true when the client sent If-Match and it does not match the current ETag
+
+def precondition_failed(etag):
+    return bool(request.if_match) and not request.if_match.contains(etag)
+
+
+#If-Match on a user update, only the user version part of the ETag has to match: the update only
+#changes the user columns, so a change of their books since the client read the user is not a reason to refuse it
+
+def user_precondition_failed(user_id):
+    if not request.if_match or request.if_match.star_tag:
+        return False
+
+    row = db.session.execute(user_etag_statement(user_id)).first()
+
+    if row is None:
+        return True
+
+    prefix = f"user-{user_id}-{row.version}-"
+    return not any(etag.startswith(prefix) for etag in request.if_match)
+
+
+def not_modified_response(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def precondition_failed_response():
+    return jsonify({"Error": "Precondition Failed"}), 412
+
+
+def etag_response(body, etag, status=200):
+    response = jsonify(body)
+    response.status_code = status
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,72 @@
+import json
+from sqlalchemy import text
+from app import db
+from app.cache import TTLCache
+from app.pagination import exact_total
+
+#Strategies to get the total row count of a paginated list
+#exact: COUNT(*) on every request
+#cached: exact count memoized per filter set for COUNT_CACHE_TTL seconds
+#approximate: row estimate from the table statistics for unfiltered lists, cached count otherwise
+
+COUNT_STRATEGIES = ("exact", "cached", "approximate")
+
+count_cache = TTLCache(maxsize=4096)
+
+
+#method to read the row estimate the database keeps for a table, returns None when there is none
+
+def estimated_row_count(table_name):
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "mysql":
+        row = db.session.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name"),
+            {"name": table_name}).first()
+
+    elif dialect == "postgresql":
+        row = db.session.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = :name"), {"name": table_name}).first()
+
+    elif dialect == "sqlite":
+        #sqlite_stat1 is created by ANALYZE, the first number of an index stat is the row count of the table
+        analyzed = db.session.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")).first()
+
+        if not analyzed:
+            return None
+
+        row = db.session.execute(text("SELECT stat FROM sqlite_stat1 WHERE tbl = :name LIMIT 1"), {"name": table_name}).first()
+        row = (int(row[0].split()[0]),) if row else None
+
+    else:
+        row = None
+
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+
+    return int(row[0])
+
+
+#method to build the count function given to paginate_query
+#the function returns the total and whether it is an estimate
+
+def make_counter(strategy, table_name, filters, ttl):
+    def count(query):
+        if strategy == "approximate" and not filters:
+            estimate = estimated_row_count(table_name)
+
+            if estimate is not None:
+                return estimate, True
+
+        if strategy == "exact":
+            return exact_total(query)
+
+        key = json.dumps([table_name, sorted(filters.items())])
+        total = count_cache.get(key)
+
+        if total is None:
+            total, _ = exact_total(query)
+            count_cache.set(key, total, ttl=ttl)
+
+        return total, False
+
+    return count
@@ -1,4 +1,5 @@
 from flask import jsonify
+from sqlalchemy.orm.exc import StaleDataError
 
 #Error Handlers for some common errors
 
@@ -9,4 +10,19 @@ def register_error_handlers(app):
     
     @app.errorhandler(500)
     def internal_server_error(error):
-        return jsonify({"Error": "Something Went Wrong"}), 500
\ No newline at end of file
+        return jsonify({"Error": "Something Went Wrong"}), 500
+    
+    #a row was changed by another request between reading and writing it
+    #the users loaded by the request may be cached with the outdated version, so they are dropped as well
+    #(the failed flush leaves nothing in session.dirty and expires the objects, the identity map still has their keys)
+    
+    @app.errorhandler(StaleDataError)
+    def conflict(error):
+        from app import db
+        from app.identity import invalidate_identity
+        from app.models.user import User
+        user_ids = [identity[0] for cls, identity, _ in db.session.identity_map.keys() if cls is User]
+        db.session.rollback()
+        for user_id in user_ids:
+            invalidate_identity(user_id)
+        return jsonify({"Error": "Resource was modified by another request"}), 409
\ No newline at end of file
@@ -0,0 +1,78 @@
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+from app.instrumentation import timed
+
+#Password hashing on a bounded process pool
+#the request thread only waits for the result, so the hashing uses every core and does not hold the GIL
+#PASSWORD_HASH_WORKERS = 0 hashes in the request thread
+
+_executor = None
+_executor_pid = None
+_lock = Lock()
+
+#the pool processes are started from a fork server (or spawned where there is none) rather than forked
+#from the worker, forking a process that runs threads (gthread, the ASGI thread pool) can copy held locks
+#the pool processes import the entry script again, which has to keep its if __name__ == "__main__" guard
+
+MP_CONTEXT = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+#hash prefix ("scrypt:32768:8:1", "pbkdf2:sha256:1000000", ...) written by each configured method
+
+_prefixes = {}
+
+
+def _get_executor(workers):
+    global _executor, _executor_pid
+
+    #a pool inherited through fork (e.g. gunicorn preload) can't be used, each process gets its own
+
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=MP_CONTEXT)
+            _executor_pid = os.getpid()
+
+        return _executor
+
+
+def _shutdown():
+    if _executor is not None and _executor_pid == os.getpid():
+        _executor.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(_shutdown)
+
+
+def _run(function, *args):
+    workers = current_app.config["PASSWORD_HASH_WORKERS"]
+
+    if workers <= 0:
+        return function(*args)
+
+    future = _get_executor(workers).submit(function, *args)
+    return future.result(timeout=current_app.config["PASSWORD_HASH_TIMEOUT"])
+
+
+def hash_password(password):
+    with timed("hash"):
+        return _run(generate_password_hash, password, current_app.config["PASSWORD_HASH_METHOD"])
+
+
+def verify_password(password_hash, password):
+    with timed("hash"):
+        return _run(check_password_hash, password_hash, password)
+
+
+#method to check if a stored hash was made with other parameters than the configured ones
+
+def needs_rehash(password_hash):
+    method = current_app.config["PASSWORD_HASH_METHOD"]
+
+    if method not in _prefixes:
+        _prefixes[method] = generate_password_hash("", method=method).split("$", 1)[0]
+
+    return password_hash.split("$", 1)[0] != _prefixes[method]
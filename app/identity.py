@@ -0,0 +1,67 @@
+from flask import jsonify
+from flask_jwt_extended.default_callbacks import default_decode_key_callback
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+from app.cache import TTLCache
+from app.instrumentation import end_phase, start_phase
+from app.models.user import User
+
+#Resolves the user behind a JWT once per request and caches it between requests
+#Handlers get the user through flask_jwt_extended's current_user, which is only meant to tell who is calling:
+#a cached user is a detached copy that may be out of date, handlers that write load the row themselves
+
+identity_cache = TTLCache()
+
+
+#method to copy the column values of a user so they can outlive the session
+
+def snapshot(user):
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+#method to drop a cached user, must be called whenever a user is updated or deleted
+
+def invalidate_identity(user_id):
+    identity_cache.delete(int(user_id))
+
+
+#method to get the user of a token, from the cache when possible
+
+def lookup_user(user_id):
+    values = identity_cache.get(user_id)
+
+    if values is None:
+        user = db.session.get(User, user_id)
+
+        if user:
+            identity_cache.set(user_id, snapshot(user))
+
+        return user
+
+    #the cached copy stays out of the session, so it is never flushed and db.session.get still loads the row
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return user
+
+
+def register_identity_loaders(app, jwt):
+    identity_cache.configure(maxsize=app.config["IDENTITY_CACHE_SIZE"], ttl=app.config["IDENTITY_CACHE_TTL"])
+
+    #the auth phase of the request timings runs from the token check to the loaded user
+
+    @jwt.decode_key_loader
+    def decode_key(jwt_header, jwt_data):
+        start_phase("auth")
+        return default_decode_key_callback(jwt_header, jwt_data)
+
+    @jwt.user_lookup_loader
+    def load_user(jwt_header, jwt_data):
+        user = lookup_user(int(jwt_data[app.config["JWT_IDENTITY_CLAIM"]]))
+        end_phase("auth")
+        return user
+
+    @jwt.user_lookup_error_loader
+    def user_not_found(jwt_header, jwt_data):
+        return jsonify({"Error": "User Not Found"}), 404
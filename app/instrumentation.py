@@ -0,0 +1,204 @@
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#Per request performance instrumentation
+#SQL statements are counted and timed with engine events, the other phases (auth, hash, serialize) with timed()
+#each response gets a Server-Timing header, slow requests and queries are logged,
+#and the latencies are aggregated in per endpoint histograms served by GET /metrics
+#the aggregates are per process, every gunicorn worker keeps its own
+
+logger = logging.getLogger(__name__)
+
+#upper bounds of the latency histogram buckets, in seconds
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+#order of the phases in the Server-Timing header
+
+PHASES = ("db", "auth", "hash", "serialize")
+
+
+class EndpointStats:
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def observe(self, seconds, queries, query_seconds):
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.queries += queries
+        self.query_seconds += query_seconds
+
+
+#timings of the current request, None outside of a request or when instrumentation is off
+
+def request_timings():
+    return g.get("timings") if has_app_context() else None
+
+
+def add_timing(phase, seconds):
+    timings = request_timings()
+
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase):
+    started = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        add_timing(phase, time.perf_counter() - started)
+
+
+#for phases that start and end in different callbacks (the JWT check)
+
+def start_phase(phase):
+    if request_timings() is not None:
+        g.phase_started[phase] = time.perf_counter()
+
+
+def end_phase(phase):
+    if request_timings() is not None and phase in g.phase_started:
+        add_timing(phase, time.perf_counter() - g.phase_started.pop(phase))
+
+
+class Instrumentation:
+
+    def __init__(self):
+        self.enabled = False
+        self.server_timing = True
+        self.slow_request = 0.5
+        self.slow_query = 0.1
+        self.stats = {}
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config["INSTRUMENTATION_ENABLED"]
+        self.server_timing = app.config["SERVER_TIMING"]
+        self.slow_request = app.config["SLOW_REQUEST_MS"] / 1000
+        self.slow_query = app.config["SLOW_QUERY_MS"] / 1000
+
+        if not self.enabled:
+            return
+
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+        #the listeners are set on the Engine class so they also cover the replicas and the async engine
+
+        if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+            event.listen(Engine, "handle_error", handle_error)
+
+    def start_request(self):
+        g.timings = {"db": 0.0}
+        g.phase_started = {}
+        g.query_count = 0
+        g.request_started = time.perf_counter()
+
+    def finish_request(self, response):
+        if "request_started" not in g:
+            return response
+
+        total = time.perf_counter() - g.request_started
+        timings = g.timings
+        endpoint = g.get("endpoint") or request.endpoint or "unmatched"
+
+        with self._lock:
+            key = (endpoint, request.method, str(response.status_code))
+            stats = self.stats.get(key)
+
+            if stats is None:
+                stats = self.stats[key] = EndpointStats()
+
+            stats.observe(total, g.query_count, timings["db"])
+
+        if self.server_timing:
+            metrics = [f'db;dur={timings["db"] * 1000:.1f};desc="{g.query_count} queries"']
+            metrics += [f"{phase};dur={timings[phase] * 1000:.1f}" for phase in PHASES[1:] if phase in timings]
+            metrics.append(f"total;dur={total * 1000:.1f}")
+            response.headers["Server-Timing"] = ", ".join(metrics)
+
+        if total >= self.slow_request:
+            logger.warning("Slow request %s %s -> %s in %.1fms (%d queries, %.1fms in the database)",
+                           request.method, request.full_path.rstrip("?"), response.status_code, total * 1000,
+                           g.query_count, timings["db"] * 1000)
+
+        return response
+
+    def record_query(self, statement, seconds):
+        timings = request_timings()
+
+        if timings is not None:
+            timings["db"] += seconds
+            g.query_count += 1
+
+        if seconds >= self.slow_query:
+            logger.warning("Slow query in %.1fms: %s", seconds * 1000, " ".join(statement.split()))
+
+    #method to render the aggregated stats in the Prometheus text format
+
+    def render_metrics(self):
+        lines = [
+            "# HELP http_request_duration_seconds Time spent handling requests",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        queries = [
+            "# HELP http_request_db_queries_total SQL statements run by requests",
+            "# TYPE http_request_db_queries_total counter",
+        ]
+        query_seconds = [
+            "# HELP http_request_db_seconds_total Time requests spent waiting on SQL statements",
+            "# TYPE http_request_db_seconds_total counter",
+        ]
+
+        with self._lock:
+            for (endpoint, method, status), stats in sorted(self.stats.items()):
+                labels = f'endpoint="{endpoint}",method="{method}",status="{status}"'
+                cumulative = 0
+
+                for bound, bucket in zip(LATENCY_BUCKETS + ("+Inf",), stats.buckets):
+                    cumulative += bucket
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {stats.seconds:.6f}")
+                lines.append(f"http_request_duration_seconds_count{{{labels}}} {stats.count}")
+                queries.append(f"http_request_db_queries_total{{{labels}}} {stats.queries}")
+                query_seconds.append(f"http_request_db_seconds_total{{{labels}}} {stats.query_seconds:.6f}")
+
+        return "\n".join(lines + queries + query_seconds) + "\n"
+
+
+instrumentation = Instrumentation()
+
+
+#engine events, the start times are kept on the connection since a statement starts and ends on it
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    instrumentation.record_query(statement, time.perf_counter() - conn.info["query_started"].pop())
+
+
+def handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+
+    if started:
+        started.pop()
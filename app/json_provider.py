@@ -0,0 +1,60 @@
+from flask.json.provider import DefaultJSONProvider
+from app.instrumentation import timed
+
+#JSON provider backed by orjson when it is installed, Flask's default provider is used otherwise
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+
+    def _options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+
+        return option
+
+    def dumps(self, obj, **kwargs):
+        #options only the stdlib encoder understands are left to it
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+
+        with timed("serialize"):
+            body = orjson.dumps(obj, default=self.default, option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+#Flask's provider with the encoding of responses timed
+
+class TimedJSONProvider(DefaultJSONProvider):
+
+    def response(self, *args, **kwargs):
+        with timed("serialize"):
+            return super().response(*args, **kwargs)
+
+
+def init_json_provider(app):
+    if orjson is not None and app.config["FAST_JSON"]:
+        app.json = OrjsonProvider(app)
+    else:
+        app.json = TimedJSONProvider(app)
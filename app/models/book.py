@@ -3,10 +3,29 @@ from app import db
 #Book Model
 
 class Book(db.Model):
+    __table_args__ = (
+        #books of a user in id order (GET /users/<id>/books, GET /books?user_id= with cursor pagination)
+        db.Index("ix_book_user_id_id", "user_id", "id"),
+        #filtering and ordering on Name and Author in GET /books
+        db.Index("ix_book_name", "Name"),
+        db.Index("ix_book_author", "Author"),
+        #full text index used by the search on Name and Author (MySQL only, SQLite uses the book_fts table)
+        db.Index("ix_book_fulltext", "Name", "Author", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     Name = db.Column(db.String(100), nullable=False)
     Author = db.Column(db.String(100), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     
+    #row version, bumped on every update and used for ETags and optimistic concurrency
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    
+    __mapper_args__ = {"version_id_col": version}
+    
+    #always NULL, lets a bulk INSERT ... RETURNING send all the rows of a batch in one statement and still
+    #match the returned ids to the rows (POST /users/<id>/books/bulk)
+    _sentinel = db.insert_sentinel()
+    
     def to_dict(self):
         return {"id": self.id, "Name": self.Name, "Author": self.Author, "user_id": self.user_id}
\ No newline at end of file
@@ -0,0 +1,13 @@
+from app import db
+
+#Change Model, one row per insert / update / delete of a book or user (GET /changes)
+#the id is the position in the feed, it only grows so "changes after id N" is a range scan of the primary key
+
+class Change(db.Model):
+    __tablename__ = "change_log"
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    entity = db.Column(db.String(10), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
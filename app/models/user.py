@@ -1,9 +1,14 @@
 from app import db
-from werkzeug.security import check_password_hash, generate_password_hash
+from app.hashing import hash_password, needs_rehash, verify_password
 
 #User Model
 
 class User(db.Model):
+    __table_args__ = (
+        #GET /users?role= in id order, the email_id prefix filter uses the unique index on email_id
+        db.Index("ix_user_role_id", "role", "id"),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(100), nullable=False)
     last_name = db.Column(db.String(100), nullable=False)
@@ -11,14 +16,28 @@ class User(db.Model):
     password_hash = db.Column(db.String(512), nullable=False)
     role = db.Column(db.String(25), nullable=False, default="user")
     
+    #row version, bumped on every update and used for ETags and optimistic concurrency
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    
+    #bumped whenever one of their books is added, changed or deleted, kept apart from version so that
+    #book writes don't conflict with updates of the user
+    books_version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    
     #One to many relationship between user and books
     books = db.relationship('Book', backref='owner', lazy=True, passive_deletes=True)
     
+    __mapper_args__ = {"version_id_col": version}
+    
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    #true when the password hash was made with outdated hashing parameters
+    
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
     
     
     def to_dict(self):
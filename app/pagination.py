@@ -0,0 +1,212 @@
+import base64
+import binascii
+import json
+import math
+from sqlalchemy import and_, or_
+
+#Helpers for cursor (keyset) pagination shared by the list endpoints
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidSort(ValueError):
+    pass
+
+
+#cursors are opaque to clients, they are just url safe base64 encoded json
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        raise InvalidCursor("Invalid cursor")
+
+    if not isinstance(values, dict) or not isinstance(values.get("id"), int):
+        raise InvalidCursor("Invalid cursor")
+
+    return values
+
+
+#method to read a true/false query parameter
+
+def parse_bool(value, default):
+    if value is None:
+        return default
+
+    return value.strip().lower() not in ("false", "0", "no", "off")
+
+
+#method to read the sort= query parameter, "Name" sorts ascending and "-Name" descending
+#allowed maps the accepted names to their columns, only indexed columns should be allowed so sort + limit is an index scan
+#returns (column, descending)
+
+def parse_sort(value, allowed, default="id"):
+    value = (value or default).strip()
+    name = value[1:] if value.startswith("-") else value
+
+    if name not in allowed:
+        raise InvalidSort(f"sort must be one of {', '.join(allowed)}, with a leading - for descending order")
+
+    return allowed[name], value.startswith("-")
+
+
+#the id is always the last sort key, so the order is the same on every request even when the sort column has duplicates
+#both keys go in the same direction, which the (column, id) index entries can be read in without a sort step
+
+def sort_keys(sort, id_column):
+    column, descending = sort
+    columns = [id_column] if column is id_column else [column, id_column]
+
+    return [column.desc() if descending else column.asc() for column in columns]
+
+
+#cursor mode is used when the client sends "after" or "before" (an empty "after" starts at the first page)
+
+def is_cursor_request(args):
+    return "after" in args or "before" in args
+
+
+#cursors of a list sorted on another column than the id also carry the value of that column ("key")
+
+def row_cursor(row, sort, id_column):
+    column, _ = sort
+    values = {"id": row.id}
+
+    if column is not id_column:
+        values["key"] = getattr(row, column.key)
+
+    return encode_cursor(values)
+
+
+#method to get the condition selecting the rows after (forward) or before a cursor in the sort order
+#written as "key >= k AND (key > k OR id > i)" so the database can seek the index on the key
+
+def cursor_condition(cursor, sort, id_column, forward):
+    column, descending = sort
+    values = decode_cursor(cursor)
+    greater = forward != descending
+
+    if column is id_column:
+        return id_column > values["id"] if greater else id_column < values["id"]
+
+    if not isinstance(values.get("key"), (str, int)):
+        raise InvalidCursor("Invalid cursor")
+
+    key = values["key"]
+
+    if greater:
+        return and_(column >= key, or_(column > key, id_column > values["id"]))
+
+    return and_(column <= key, or_(column < key, id_column < values["id"]))
+
+
+#method to fetch one page of a query using keyset pagination over the sort column and the id
+#the cost is independent of how deep the page is because no OFFSET is used
+
+def keyset_page(query, id_column, args, limit, sort=None):
+    sort = sort or (id_column, False)
+    after = args.get("after")
+    before = args.get("before")
+
+    if before:
+        column, descending = sort
+        reverse = (column, not descending)
+        rows = query.filter(cursor_condition(before, sort, id_column, False)).order_by(*sort_keys(reverse, id_column)).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+
+        has_prev = has_more
+        has_next = True
+
+    else:
+        if after:
+            query = query.filter(cursor_condition(after, sort, id_column, True))
+
+        rows = query.order_by(*sort_keys(sort, id_column)).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        has_prev = bool(after)
+        has_next = has_more
+
+    next_cursor = row_cursor(rows[-1], sort, id_column) if rows and has_next else None
+    prev_cursor = row_cursor(rows[0], sort, id_column) if rows and has_prev else None
+
+    return rows, next_cursor, prev_cursor
+
+
+#method to build the paginated response of a list endpoint in page mode or cursor mode
+#serialize turns the list of rows of a page into a list of dicts
+#returns the response body and the status code
+
+#count returns (total, is_estimate), by default an exact COUNT(*) of the query
+
+def exact_total(query):
+    return query.order_by(None).count(), False
+
+
+def add_total(response, total, is_estimate, per_page=None):
+    response["total"] = total
+
+    if per_page:
+        response["total pages"] = math.ceil(total / per_page)
+
+    if is_estimate:
+        response["total_estimated"] = True
+
+
+#sort is (column, descending) as returned by parse_sort, by default the list is in id order
+
+def paginate_query(query, id_column, args, key, serialize, count=exact_total, sort=None):
+    sort = sort or (id_column, False)
+    limit = args.get("limit", 10, type=int)
+    include_total = parse_bool(args.get("include_total"), True)
+
+    #cursor mode, cost does not grow with page depth
+
+    if is_cursor_request(args):
+
+        if limit < 1:
+            return {"Error": "Validation Failed", "Details": {"limit": "limit must be atleast 1"}}, 400
+
+        try:
+            items, next_cursor, prev_cursor = keyset_page(query, id_column, args, limit, sort)
+        except InvalidCursor as e:
+            return {"Error": "Validation Failed", "Details": {"cursor": str(e)}}, 400
+
+        response = {
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+            key: serialize(items)
+        }
+
+        if include_total:
+            add_total(response, *count(query))
+
+        return response, 200
+
+    #page mode
+
+    page = args.get("page", 1, type=int)
+    paginated = query.order_by(*sort_keys(sort, id_column)).paginate(page=page, per_page=limit, error_out=False, count=False)
+
+    response = {
+        "page": page,
+        "limit": limit,
+        key: serialize(paginated.items)
+    }
+
+    if include_total:
+        add_total(response, *count(query), paginated.per_page)
+
+    return response, 200
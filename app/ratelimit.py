@@ -0,0 +1,112 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+#Token bucket rate limiting for the login endpoint
+#buckets live in process memory by default, RATELIMIT_STORAGE_URI = "redis://..." shares them between processes
+
+
+class MemoryBackend:
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+    #takes one token from a bucket, returns 0 when allowed or the seconds to wait for the next token
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+            else:
+                retry_after = (1 - tokens) / rate
+
+            #least recently used buckets are dropped first, a dropped bucket is simply full again
+
+            self._buckets[key] = (tokens, now)
+
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return retry_after
+
+
+class RedisBackend:
+
+    #the bucket is updated atomically inside redis
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        retry_after = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(retry_after)
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return float(self.script(keys=[f"ratelimit:{key}"], args=[capacity, rate, time.time()]))
+
+
+def create_backend(uri, max_keys):
+    if uri.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(uri)
+
+    return MemoryBackend(max_keys)
+
+
+class LoginLimiter:
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.enabled = True
+        self.per_ip = 20
+        self.per_email = 5
+        self.period = 60
+
+    def init_app(self, app):
+        self.backend = create_backend(app.config["RATELIMIT_STORAGE_URI"], app.config["RATELIMIT_MAX_KEYS"])
+        self.enabled = app.config["LOGIN_RATE_LIMIT_ENABLED"]
+        self.per_ip = app.config["LOGIN_RATE_LIMIT_PER_IP"]
+        self.per_email = app.config["LOGIN_RATE_LIMIT_PER_EMAIL"]
+        self.period = app.config["LOGIN_RATE_LIMIT_PERIOD"]
+
+    #method to record a login attempt, returns 0 when allowed or the seconds the client has to wait
+    #a full bucket holds "per_ip"/"per_email" attempts and refills completely in "period" seconds
+
+    def hit(self, ip, email_id):
+        if not self.enabled:
+            return 0
+
+        retry_after = self.backend.take(f"login:ip:{ip}", self.per_ip, self.per_ip / self.period)
+
+        if retry_after or not email_id:
+            return retry_after
+
+        return self.backend.take(f"login:email:{email_id}", self.per_email, self.per_email / self.period)
+
+
+login_limiter = LoginLimiter()
@@ -0,0 +1,108 @@
+import time
+from itertools import count
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+#Routing of reads to read replicas
+#replicas are extra Flask-SQLAlchemy binds ("replica-0", "replica-1", ...) built from REPLICA_DATABASE_URIS
+#GET requests go to the replicas in turn, skipping the ones that failed their last health check
+#the replica is picked once per request (the session lives as long as the request), so every read of a request
+#(the ETag version and the body, a page and its count) comes from the same replica
+#writes, and every statement after the first write of a request, stay on the primary
+
+READ_METHODS = ("GET", "HEAD")
+
+
+class ReplicaRouter:
+
+    def __init__(self):
+        self.bind_keys = []
+        self.health = {}
+        self.health_interval = 5
+        self._counter = count()
+
+    #must run before db.init_app, the replicas are created by Flask-SQLAlchemy with the other binds
+
+    def init_app(self, app):
+        from config import engine_options
+
+        uris = [uri.strip() for uri in app.config["REPLICA_DATABASE_URIS"].split(",") if uri.strip()]
+        binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+        self.bind_keys = []
+        self.health = {}
+        self.health_interval = app.config["REPLICA_HEALTH_INTERVAL"]
+
+        for index, uri in enumerate(uris):
+            key = f"replica-{index}"
+            binds[key] = {"url": uri, **engine_options(app.config, uri)}
+            self.bind_keys.append(key)
+
+    #a replica is checked with SELECT 1 at most once per health interval, the result is kept until the next check
+
+    def is_healthy(self, key, engine):
+        healthy, checked_at = self.health.get(key, (True, None))
+        now = time.monotonic()
+
+        if checked_at is not None and now - checked_at < self.health_interval:
+            return healthy
+
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            healthy = True
+        except SQLAlchemyError:
+            healthy = False
+
+        self.health[key] = (healthy, now)
+        return healthy
+
+    #method to pick the next healthy replica, returns None when there is none
+
+    def choose(self, engines):
+        if not self.bind_keys:
+            return None
+
+        start = next(self._counter)
+
+        for offset in range(len(self.bind_keys)):
+            key = self.bind_keys[(start + offset) % len(self.bind_keys)]
+
+            if self.is_healthy(key, engines[key]):
+                return engines[key]
+
+        return None
+
+
+replica_router = ReplicaRouter()
+
+
+def is_read_request():
+    return has_request_context() and request.method in READ_METHODS
+
+
+#session class of db.session, only changes the engine of statements that would go to the primary
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+        if bind is not None or engine is not self._db.engines.get(None):
+            return engine
+
+        #once a request writes, it reads its own writes from the primary
+
+        if self._flushing or getattr(clause, "is_dml", False):
+            self.info["primary"] = True
+
+        if self.info.get("primary") or not is_read_request():
+            return engine
+
+        #the primary is kept as well when no replica is healthy, so a request never mixes both
+
+        if "read_engine" not in self.info:
+            self.info["read_engine"] = replica_router.choose(self._db.engines) or engine
+
+        return self.info["read_engine"]
@@ -0,0 +1,127 @@
+import json
+from functools import wraps
+from threading import Lock
+from flask import Response, make_response, request
+from flask_jwt_extended import get_jwt
+from app.cache import TTLCache
+
+#Cache of whole responses for the admin list endpoints
+#entries are keyed on (endpoint, query args, role) and on the generation of every namespace the response
+#depends on ("books", "users"), a write bumps the generation so older entries are never read again
+
+
+class MemoryBackend:
+
+    def __init__(self, maxsize, ttl):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.generations = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries.set(key, value)
+
+    def generation(self, namespace):
+        return self.generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self._lock:
+            self.generations[namespace] = self.generations.get(namespace, 0) + 1
+
+
+class RedisBackend:
+
+    #entries and generations are shared by every process using the same redis
+
+    def __init__(self, url, ttl):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get(f"response:{key}")
+        return tuple(json.loads(value)) if value else None
+
+    def set(self, key, value):
+        self.client.set(f"response:{key}", json.dumps(value), ex=self.ttl)
+
+    def generation(self, namespace):
+        return int(self.client.get(f"response-generation:{namespace}") or 0)
+
+    def bump(self, namespace):
+        self.client.incr(f"response-generation:{namespace}")
+
+
+class ResponseCache:
+
+    def __init__(self):
+        self.backend = MemoryBackend(1024, 30)
+        self.enabled = True
+
+    def init_app(self, app):
+        self.enabled = app.config["RESPONSE_CACHE_ENABLED"]
+        uri = app.config["RESPONSE_CACHE_STORAGE_URI"]
+
+        if uri.startswith(("redis://", "rediss://", "unix://")):
+            self.backend = RedisBackend(uri, app.config["RESPONSE_CACHE_TTL"])
+        else:
+            self.backend = MemoryBackend(app.config["RESPONSE_CACHE_SIZE"], app.config["RESPONSE_CACHE_TTL"])
+
+    #the order of the query args does not matter, "?page=2&limit=5" and "?limit=5&page=2" share an entry
+
+    def make_key(self, endpoint, args, role, namespaces):
+        normalized = sorted((name, sorted(values)) for name, values in args.lists())
+        generations = [self.backend.generation(namespace) for namespace in namespaces]
+        return json.dumps([endpoint, normalized, role, generations], separators=(",", ":"))
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            self.backend.bump(namespace)
+
+
+response_cache = ResponseCache()
+
+
+#method to drop the cached responses that depend on books and/or users, called after every write
+
+def invalidate_responses(*namespaces):
+    response_cache.invalidate(*namespaces)
+
+
+#query args of requests that are never cached, streams are not stored and id lookups depend on the caller, not only the role
+
+UNCACHED_ARGS = ("stream", "ids")
+
+
+#decorator for GET list endpoints, must be used under @jwt_required() since the role is part of the key
+#only successful, non streamed responses are stored
+
+def cached_response(*namespaces):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not response_cache.enabled or any(name in request.args for name in UNCACHED_ARGS):
+                return view(*args, **kwargs)
+
+            role = get_jwt()["role"].lower()
+            key = response_cache.make_key(request.endpoint, request.args, role, namespaces)
+            cached = response_cache.backend.get(key)
+
+            if cached:
+                body, status, mimetype = cached
+                response = Response(body, status=status, mimetype=mimetype)
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            response = make_response(view(*args, **kwargs))
+
+            if response.status_code == 200 and not response.is_streamed:
+                response_cache.backend.set(key, (response.get_data(as_text=True), response.status_code, response.mimetype))
+                response.headers["X-Cache"] = "MISS"
+
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,78 @@
+import re
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+from app import db
+from app.models.book import Book
+
+#Full text search over book Name and Author
+#MySQL uses the FULLTEXT index, SQLite uses the book_fts FTS5 table, anything else falls back to LIKE
+
+FULLTEXT_INDEX = "ix_book_fulltext"
+FTS_TABLE = "book_fts"
+
+fts = sa.table(FTS_TABLE, sa.column("rowid"), sa.column("rank"))
+
+word_pattern = re.compile(r"\w+")
+
+#backend detection is done once per engine
+
+_backends = {}
+
+
+def fulltext_backend(engine):
+    if engine in _backends:
+        return _backends[engine]
+
+    backend = None
+
+    if engine.dialect.name == "mysql":
+        indexes = sa.inspect(engine).get_indexes("book")
+        if any(index["name"] == FULLTEXT_INDEX for index in indexes):
+            backend = "mysql"
+
+    elif engine.dialect.name == "sqlite":
+        with engine.connect() as connection:
+            found = connection.execute(
+                sa.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": FTS_TABLE}).first()
+        if found:
+            backend = "fts5"
+
+    _backends[engine] = backend
+    return backend
+
+
+#FTS5 has its own query syntax, so every word is quoted to be matched literally
+
+def fts5_query(term):
+    return " ".join(f'"{word}"' for word in word_pattern.findall(term))
+
+
+#method to apply a search term to a book query, results are ordered by relevance when ranked is True
+
+def search_books(query, term, ranked=True):
+    backend = fulltext_backend(db.engine)
+
+    if backend == "mysql":
+        relevance = mysql.match(Book.Name, Book.Author, against=term).in_natural_language_mode()
+        query = query.filter(relevance)
+
+        if ranked:
+            query = query.order_by(relevance.desc())
+
+        return query
+
+    if backend == "fts5" and fts5_query(term):
+        matches = (sa.select(fts.c.rowid.label("book_id"), fts.c.rank.label("rank"))
+                   .where(sa.literal_column(FTS_TABLE).op("MATCH")(fts5_query(term)))
+                   .subquery())
+        query = query.join(matches, matches.c.book_id == Book.id)
+
+        if ranked:
+            query = query.order_by(matches.c.rank)
+
+        return query
+
+    #fallback when the backend has no full text support
+
+    return query.filter(sa.or_(Book.Name.like(f"%{term}%"), Book.Author.like(f"%{term}%")))
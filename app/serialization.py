@@ -0,0 +1,132 @@
+from collections import defaultdict
+from sqlalchemy import select
+from app import db
+from app.models.book import Book
+from app.models.user import User
+
+#Serializers for read only endpoints
+#rows are built straight from the selected columns instead of hydrating ORM objects
+#the output is the same as Book.to_dict() / User.to_dict(), or a subset of it with fields=
+
+#field name -> columns needed to build it, "books" comes from a separate query
+
+BOOK_FIELDS = {
+    "id": (Book.id,),
+    "Name": (Book.Name,),
+    "Author": (Book.Author,),
+    "user_id": (Book.user_id,),
+}
+
+USER_FIELDS = {
+    "id": (User.id,),
+    "Name": (User.first_name, User.last_name),
+    "email_id": (User.email_id,),
+    "role": (User.role,),
+    "books": (),
+}
+
+#ids per IN (...) list, keeps large pages under the bind parameter limits
+
+IN_BATCH_SIZE = 1000
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+#method to read the fields= query parameter, returns None (all fields) when it is not given
+
+def parse_fields(value, allowed):
+    if value is None:
+        return None
+
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+
+    if not fields or unknown:
+        raise InvalidFields(f"fields must be a comma separated list of {', '.join(allowed)}")
+
+    return list(dict.fromkeys(fields))
+
+
+#method to get the columns to SELECT for the requested fields, id is always selected for ordering and cursors
+
+def columns_for(field_map, fields):
+    columns = [field_map["id"][0]]
+
+    for field in fields or field_map:
+        for column in field_map[field]:
+            if column not in columns:
+                columns.append(column)
+
+    return columns
+
+
+def book_columns(fields=None):
+    return columns_for(BOOK_FIELDS, fields)
+
+
+def user_columns(fields=None):
+    return columns_for(USER_FIELDS, fields)
+
+
+def books_to_dicts(rows, fields=None):
+    fields = fields or BOOK_FIELDS
+
+    return [{field: getattr(row, field) for field in fields} for row in rows]
+
+
+#method to fetch rows by id with one IN query per batch, returns {id: row}
+
+def rows_by_id(columns, id_column, ids):
+    rows = {}
+
+    for start in range(0, len(ids), IN_BATCH_SIZE):
+        batch = ids[start:start + IN_BATCH_SIZE]
+        rows.update((row.id, row) for row in db.session.execute(select(*columns).where(id_column.in_(batch))))
+
+    return rows
+
+
+#statements to fetch the book ids of many users, one per IN batch
+
+def book_ids_statements(user_ids):
+    for start in range(0, len(user_ids), IN_BATCH_SIZE):
+        batch = user_ids[start:start + IN_BATCH_SIZE]
+        yield select(Book.user_id, Book.id).where(Book.user_id.in_(batch)).order_by(Book.user_id, Book.id)
+
+
+def book_ids_by_user(user_ids):
+    book_ids = defaultdict(list)
+
+    for statement in book_ids_statements(user_ids):
+        for user_id, book_id in db.session.execute(statement):
+            book_ids[user_id].append(book_id)
+
+    return book_ids
+
+
+#book_ids can be given by callers that already loaded them (the async handlers)
+
+def users_to_dicts(rows, fields=None, book_ids=None):
+    fields = fields or USER_FIELDS
+
+    if book_ids is None:
+        book_ids = book_ids_by_user([row.id for row in rows]) if "books" in fields else {}
+
+    users = []
+
+    for row in rows:
+        user = {}
+
+        for field in fields:
+            if field == "Name":
+                user["Name"] = row.first_name + " " + row.last_name
+            elif field == "books":
+                user["books"] = book_ids.get(row.id, [])
+            else:
+                user[field] = getattr(row, field)
+
+        users.append(user)
+
+    return users
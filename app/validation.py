@@ -0,0 +1,169 @@
+import re
+from flask import current_app, has_app_context
+from email_validator import validate_email, EmailNotValidError
+
+#Validation helpers shared by the auth, user and book blueprints
+#every payload is checked against a schema, the patterns are compiled once when the module is imported
+
+NAME_PATTERN = re.compile(r"^[A-Za-z ]+$")
+
+#rules: min 8 chars, at least 1 uppercase, 1 lowercase, 1 digit, 1 special char
+PASSWORD_PATTERN = re.compile(r"^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&])[A-Za-z\d@$!%*?&]{8,}$")
+
+PASSWORD_RULES = "password must contain min 8 chars, at least 1 uppercase, 1 lowercase, 1 digit, 1 special char"
+
+#ids are signed 32 bit integers in the database, anything outside can't be an id and overflows the drivers
+MAX_ID = 2**31 - 1
+
+
+#--------- CHECKS ---------
+#a check returns an error message or None
+
+def matches(pattern, message):
+    def check(value):
+        if not isinstance(value, str) or not pattern.match(value):
+            return message
+    return check
+
+
+def length_between(minimum, maximum, too_short, too_long):
+    def check(value):
+        if not isinstance(value, str) or len(value) < minimum:
+            return too_short
+        if len(value) > maximum:
+            return too_long
+    return check
+
+
+def one_of(choices, message):
+    def check(value):
+        if not isinstance(value, str) or value.lower() not in choices:
+            return message
+    return check
+
+
+#email syntax is checked without DNS lookups unless EMAIL_CHECK_DELIVERABILITY is turned on
+
+def email_address(value):
+    if not isinstance(value, str):
+        return "The email address is not valid."
+
+    check_deliverability = has_app_context() and current_app.config.get("EMAIL_CHECK_DELIVERABILITY", False)
+
+    try:
+        validate_email(value, check_deliverability=check_deliverability)
+    except EmailNotValidError as e:
+        return str(e)
+
+
+#--------- SCHEMAS ---------
+#field name -> (required, message when missing or empty, checks)
+
+FIRST_NAME = (True, "First name is required", [matches(NAME_PATTERN, "First name should only contain alphabets and spaces")])
+LAST_NAME = (True, "Last name is required", [matches(NAME_PATTERN, "Last name should only contain alphabets and spaces")])
+PASSWORD = (True, "Password is required", [matches(PASSWORD_PATTERN, PASSWORD_RULES)])
+
+USER_SCHEMA = {
+    "first_name": FIRST_NAME,
+    "last_name": LAST_NAME,
+    "email_id": (True, "email id is required", [email_address]),
+    "password": PASSWORD,
+    "role": (False, "Invalid role", [one_of(("admin", "user"), "Invalid role")]),
+}
+
+USER_UPDATE_SCHEMA = {key: USER_SCHEMA[key] for key in ("first_name", "last_name", "email_id", "password")}
+
+CREDENTIALS_SCHEMA = {
+    "email_id": (True, "Email Id is required", [email_address]),
+    "password": PASSWORD,
+}
+
+BOOK_SCHEMA = {
+    "Name": (True, "Book name is required", [length_between(2, 255, "Book name must be atleast 2 characters long", "Book name must not exceed 255 characters")]),
+    "Author": (True, "Author name is required", [matches(NAME_PATTERN, "Author name must contain only alphabets and spaces")]),
+}
+
+
+#method to validate data against a schema
+#with partial=True (updates) only the fields present in data are checked
+
+def validate(data, schema, missing_message, partial=False):
+    errors = {}
+
+    if not data:
+        errors["data"] = missing_message
+        return errors
+
+    for field, (required, required_message, checks) in schema.items():
+        if field not in data:
+            if required and not partial:
+                errors[field] = required_message
+            continue
+
+        if not data[field]:
+            errors[field] = required_message
+            continue
+
+        for check in checks:
+            error = check(data[field])
+
+            if error:
+                errors[field] = error
+                break
+
+    return errors
+
+
+#--------- VALIDATION HELPERS ---------
+
+def validate_password(password):
+    return bool(isinstance(password, str) and PASSWORD_PATTERN.match(password))
+
+
+def validate_user_create(data):
+    return validate(data, USER_SCHEMA, "User data is required")
+
+
+def validate_user_update(data):
+    return validate(data, USER_UPDATE_SCHEMA, "User data is required", partial=True)
+
+
+def validate_credentials(data):
+    return validate(data, CREDENTIALS_SCHEMA, "Credentials are required")
+
+
+def validate_book_create(data):
+    return validate(data, BOOK_SCHEMA, "Book data is required")
+
+
+def validate_book_update(data):
+    return validate(data, BOOK_SCHEMA, "Book data is required", partial=True)
+
+
+#method to check that a value can be the id of a row
+
+def is_valid_id(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 1 <= value <= MAX_ID
+
+
+#method to read a comma separated list of ids like "1,2,3", returns None when it is not valid
+
+def parse_id_list(value):
+    try:
+        ids = [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        return None
+
+    if not all(is_valid_id(item) for item in ids):
+        return None
+
+    return list(dict.fromkeys(ids)) or None
+
+
+#method to read a json list of ids like [1, 2, 3], returns None when it is not valid
+
+def parse_id_array(value):
+    if not isinstance(value, list) or not all(is_valid_id(item) for item in value):
+        return None
+
+    return list(dict.fromkeys(value)) or None
@@ -0,0 +1,7 @@
+from app import create_app
+from app.asgi import create_asgi_app
+
+#ASGI entry point, e.g. uvicorn asgi:app
+#needs uvicorn and the async driver of the database (aiomysql for MySQL, aiosqlite for SQLite)
+
+app = create_asgi_app(create_app())
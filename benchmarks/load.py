@@ -0,0 +1,328 @@
+"""Load test of every endpoint
+
+Builds the app with create_app() against a seeded database, then drives each route
+with concurrent clients (threads with their own Flask test client, no network) and
+reports p50/p95/p99 latency, requests per second and SQL statements per request.
+Streamed bodies (the exports) are read to the end inside the measurement, and the statements
+are counted with an engine event since the Server-Timing header is sent before the stream runs.
+
+--save writes the results to a JSON file, --baseline compares a run with such a file:
+scenarios whose p95 or throughput got worse than --tolerance, or that run more SQL
+statements per request, are flagged and the exit status is 1.
+
+Usage: python -m benchmarks.load [--users 1000] [--books 20000] [--clients 8] [--requests 400]
+                                 [--only get_books,login] [--save results.json] [--baseline results.json]
+The database is dropped and recreated, never point it at real data.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from benchmarks.query_plans import seed
+
+PASSWORD = "Passw0rd!"
+
+#statements run by a login are dominated by password hashing, so fewer of them are sent
+
+SLOW_SCENARIOS = {"login": 0.1, "register": 0.1}
+
+#extra SQL statements per request allowed before a regression is flagged
+#responses served from the response cache run no SQL, so the average of the cached endpoints moves a little between runs
+
+SQL_TOLERANCE = 0.1
+
+
+#SQL statements of the request measured in the current thread, each client thread sends one request at a time
+
+statement_counter = threading.local()
+
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    if getattr(statement_counter, "active", False):
+        statement_counter.count += 1
+
+
+class Scenario:
+
+    #request(i, client) returns (method, path, headers, json body) of the i-th request, sent by the client-th thread
+    #every client thread acts as its own user, so two threads never write the same rows at once
+    #prepare(n), when given, creates what n requests will consume (books or users to delete) before the timing starts
+
+    def __init__(self, name, expected, request, prepare=None):
+        self.name = name
+        self.expected = expected
+        self.request = request
+        self.prepare = prepare
+
+
+#method to create the users that log in and own books during the run, every client acts as one of them
+
+def create_bench_users(db, User, Book, clients, books_per_user):
+    from werkzeug.security import generate_password_hash
+    from flask import current_app
+
+    password_hash = generate_password_hash(PASSWORD, current_app.config["PASSWORD_HASH_METHOD"])
+    rows = [{"first_name": "Bench", "last_name": "User", "email_id": f"bench{i}@example.com",
+             "password_hash": password_hash, "role": "admin" if i == 0 else "user"} for i in range(clients + 1)]
+    db.session.execute(User.__table__.insert(), rows)
+    ids = db.session.execute(db.select(User.id).where(User.email_id.like("bench%@example.com")).order_by(User.id)).scalars().all()
+
+    db.session.execute(Book.__table__.insert(), [{"Name": f"Bench {n}", "Author": "Bench Author", "user_id": user_id}
+                                                 for user_id in ids[1:] for n in range(books_per_user)])
+    db.session.commit()
+
+    return ids[0], ids[1:]
+
+
+def insert_books(db, Book, owners, n, name):
+    db.session.execute(Book.__table__.insert(), [{"Name": name, "Author": "Bench Author", "user_id": owners[i % len(owners)]}
+                                                 for i in range(n)])
+    db.session.commit()
+
+    rows = db.session.execute(db.select(Book.id, Book.user_id).where(Book.Name == name).order_by(Book.id)).all()
+    return [tuple(row) for row in rows]
+
+
+def build_scenarios(app, db, User, Book, admin_id, user_ids):
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        tokens = {user_id: create_access_token(identity=str(user_id), additional_claims={"role": "user"}) for user_id in user_ids}
+        tokens[admin_id] = create_access_token(identity=str(admin_id), additional_claims={"role": "admin"})
+        owned = {user_id: db.session.execute(db.select(Book.id).where(Book.user_id == user_id).order_by(Book.id)).scalars().all()
+                 for user_id in user_ids}
+
+    def auth(user_id):
+        return {"Authorization": f"Bearer {tokens[user_id]}"}
+
+    def owned_book(i, client):
+        books = owned[user_ids[client]]
+        return user_ids[client], books[i % len(books)]
+
+    admin = auth(admin_id)
+    targets = {}
+    registered = count()
+
+    #requests are not spread evenly over the client threads, so every client gets books for all n requests
+
+    def prepare_books(name, per_request):
+        def prepare(n):
+            with app.app_context():
+                targets[name] = {user_id: [] for user_id in user_ids}
+
+                for book_id, user_id in insert_books(db, Book, user_ids, n * per_request * len(user_ids), f"Bench {name}"):
+                    targets[name][user_id].append(book_id)
+        return prepare
+
+    def prepare_users(n):
+        with app.app_context():
+            db.session.execute(User.__table__.insert(), [{"first_name": "Delete", "last_name": "Me", "email_id": f"delete{i}@example.com",
+                                                          "password_hash": "x", "role": "user"} for i in range(n)])
+            db.session.commit()
+            targets["delete_user"] = db.session.execute(
+                db.select(User.id).where(User.email_id.like("delete%@example.com")).order_by(User.id)).scalars().all()
+
+    #each request takes the next books of its client
+
+    def delete_book_request(i, client):
+        return "DELETE", f"/books/{targets['delete_book'][user_ids[client]].pop()}", auth(user_ids[client]), None
+
+    def delete_books_request(i, client):
+        books = targets["delete_books"][user_ids[client]]
+        batch = [books.pop() for _ in range(min(10, len(books)))]
+        return "DELETE", f"/books/?ids={','.join(str(book_id) for book_id in batch)}", auth(user_ids[client]), None
+
+    return [
+        Scenario("login", 200, lambda i, client: ("POST", "/login", {}, {"email_id": f"bench{client + 1}@example.com", "password": PASSWORD})),
+        Scenario("register", 201, lambda i, client: ("POST", "/register", {}, {"first_name": "New", "last_name": "User",
+                                                                                "email_id": f"new{next(registered)}@example.com", "password": PASSWORD})),
+        Scenario("get_users", 200, lambda i, client: ("GET", f"/users/?page={i % 20 + 1}&limit=20", admin, None)),
+        Scenario("get_users_cursor", 200, lambda i, client: ("GET", "/users/?after=&limit=20&role=user", admin, None)),
+        Scenario("get_user", 200, lambda i, client: ("GET", f"/users/{user_ids[client]}", auth(user_ids[client]), None)),
+        Scenario("get_user_books", 200, lambda i, client: ("GET", f"/users/{user_ids[client]}/books", auth(user_ids[client]), None)),
+        Scenario("add_book_to_user", 201, lambda i, client: ("POST", f"/users/{user_ids[client]}/books", auth(user_ids[client]),
+                                                             {"Name": "Added", "Author": "Bench Author"})),
+        Scenario("add_books_to_user", 201, lambda i, client: ("POST", f"/users/{user_ids[client]}/books/bulk", auth(user_ids[client]),
+                                                              [{"Name": f"Bulk {n}", "Author": "Bench Author"} for n in range(10)])),
+        Scenario("update_user", 200, lambda i, client: ("PUT", f"/users/{user_ids[client]}", auth(user_ids[client]), {"first_name": "Renamed"})),
+        Scenario("get_books", 200, lambda i, client: ("GET", f"/books/?page={i % 20 + 1}&limit=20", admin, None)),
+        Scenario("get_books_search", 200, lambda i, client: ("GET", "/books/?q=Dune&limit=20", admin, None)),
+        Scenario("get_books_author", 200, lambda i, client: ("GET", "/books/?Author=Austen&limit=20", admin, None)),
+        Scenario("get_books_ids", 200, lambda i, client: ("GET", f"/books/?ids={','.join(str(book_id) for book_id in owned[user_ids[client]])}",
+                                                          auth(user_ids[client]), None)),
+        Scenario("get_users_ids", 200, lambda i, client: ("GET", f"/users/?ids={','.join(str(user_id) for user_id in user_ids)}", admin, None)),
+        Scenario("export_books", 200, lambda i, client: ("GET", f"/books/export?user_id={user_ids[client]}", admin, None)),
+        Scenario("get_changes", 200, lambda i, client: ("GET", "/changes?limit=100", admin, None)),
+        Scenario("get_book", 200, lambda i, client: ("GET", f"/books/{owned_book(i, client)[1]}", auth(user_ids[client]), None)),
+        Scenario("update_book", 200, lambda i, client: ("PUT", f"/books/{owned_book(i, client)[1]}", auth(user_ids[client]), {"Name": f"Updated {i}"})),
+        Scenario("update_books", 200, lambda i, client: ("PATCH", "/books/", auth(user_ids[client]),
+                                                         [{"id": book_id, "Name": f"Patched {i}"} for book_id in owned[user_ids[client]][:10]])),
+        Scenario("delete_book", 200, delete_book_request, prepare_books("delete_book", 1)),
+        Scenario("delete_books", 200, delete_books_request, prepare_books("delete_books", 10)),
+        Scenario("delete_user", 200, lambda i, client: ("DELETE", f"/users/{targets['delete_user'][i]}", admin, None), prepare_users),
+        Scenario("metrics", 200, lambda i, client: ("GET", "/metrics", {}, None)),
+    ]
+
+
+def percentile(quantiles, p):
+    return quantiles[p - 1] if quantiles else 0.0
+
+
+def run(app, scenario, n, clients):
+    local = threading.local()
+    client_ids = count()
+
+    def send(i):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+            local.index = next(client_ids)
+
+        method, path, headers, body = scenario.request(i, local.index)
+        statement_counter.count = 0
+        statement_counter.active = True
+        start = time.perf_counter()
+
+        #the test client does not run a streamed body until it is read
+
+        try:
+            response = local.client.open(path, method=method, headers=headers, json=body)
+            response.get_data()
+            response.close()
+        finally:
+            statement_counter.active = False
+
+        elapsed = (time.perf_counter() - start) * 1000
+        return elapsed, statement_counter.count, response.status_code == scenario.expected
+
+    if scenario.prepare:
+        scenario.prepare(n)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(send, range(n)))
+    wall = time.perf_counter() - start
+
+    latencies = [elapsed for elapsed, _, _ in results]
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+
+    return {
+        "requests": n,
+        "errors": sum(1 for _, _, ok in results if not ok),
+        "p50": percentile(quantiles, 50),
+        "p95": percentile(quantiles, 95),
+        "p99": percentile(quantiles, 99),
+        "rps": n / wall,
+        "sql": statistics.mean(queries for _, queries, _ in results),
+    }
+
+
+#method to flag the scenarios that got slower, less throughput or more SQL statements than the baseline
+
+def compare(results, baseline, tolerance):
+    regressions = []
+
+    for name, result in results.items():
+        before = baseline.get(name)
+
+        if not before:
+            continue
+
+        if result["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95']:.2f} -> {result['p95']:.2f} ms")
+        if result["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {before['rps']:.0f} -> {result['rps']:.0f} req/s")
+        if result["sql"] > before["sql"] + SQL_TOLERANCE:
+            regressions.append(f"{name}: {before['sql']:.2f} -> {result['sql']:.2f} SQL statements per request")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400, help="requests per scenario")
+    parser.add_argument("--only", help="comma separated scenario names")
+    parser.add_argument("--database-uri", help="defaults to a temporary SQLite file")
+    parser.add_argument("--no-response-cache", action="store_true", help="measure the list endpoints without the response cache")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results saved by an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a regression is flagged (default 0.2)")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URI"] = args.database_uri or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.db")
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-of-enough-length")
+    os.environ["LOGIN_RATE_LIMIT_ENABLED"] = "false"
+    os.environ["INSTRUMENTATION_ENABLED"] = "true"
+    os.environ["SLOW_REQUEST_MS"] = os.environ["SLOW_QUERY_MS"] = str(10 ** 9)
+
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+    from app import create_app, db
+    from app.models.book import Book
+    from app.models.user import User
+
+    app = create_app()
+    event.listen(Engine, "before_cursor_execute", count_statement)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        print(f"seeding {args.users} users and {args.books} books into {db.engine.url.render_as_string()}")
+        seed(db, User, Book, args.users, args.books)
+        admin_id, user_ids = create_bench_users(db, User, Book, args.clients, 20)
+
+    scenarios = build_scenarios(app, db, User, Book, admin_id, user_ids)
+
+    if args.only:
+        names = args.only.split(",")
+        scenarios = [scenario for scenario in scenarios if scenario.name in names]
+
+    #a first login starts the password hashing pool, it is not part of any measurement
+
+    app.test_client().post("/login", json={"email_id": "bench1@example.com", "password": PASSWORD})
+
+    print(f"\n{'scenario':<20}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'sql/req':>9}")
+    results = {}
+
+    for scenario in scenarios:
+        n = max(args.clients, int(args.requests * SLOW_SCENARIOS.get(scenario.name, 1)))
+        result = results[scenario.name] = run(app, scenario, n, args.clients)
+        print(f"{scenario.name:<20}{result['requests']:>9}{result['errors']:>8}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+              f"{result['p99']:>10.2f}{result['rps']:>9.0f}{result['sql']:>9.2f}")
+
+    settings = {key: getattr(args, key) for key in ("users", "books", "clients", "requests", "no_response_cache")}
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({"settings": settings, "results": results}, file, indent=2)
+        print(f"\nresults saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+        if baseline["settings"] != settings:
+            print(f"\nwarning: the baseline was made with other settings {baseline['settings']}")
+
+        regressions = compare(results, baseline["results"], args.tolerance)
+        print("\n" + ("\n".join(f"REGRESSION {line}" for line in regressions) if regressions else "no regression against the baseline"))
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
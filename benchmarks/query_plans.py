@@ -0,0 +1,139 @@
+"""Query plans and latency of the list endpoint queries, without and with the indexes
+
+Seeds a database with users and books, then runs the queries issued by the list
+endpoints twice: once with the indexes from the "add indexes for list endpoints"
+migration dropped, and once with them in place. For each query the plan
+(EXPLAIN QUERY PLAN on SQLite, EXPLAIN on MySQL) and the median latency are printed.
+
+Usage: python -m benchmarks.query_plans [--users 10000] [--books 200000] [--database-uri sqlite:///...]
+The database is dropped and recreated, never point it at real data.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+INDEXES = ["ix_book_user_id_id", "ix_book_name", "ix_book_author", "ix_user_role_id"]
+
+WORDS = ["Dune", "Emma", "Night", "River", "Stone", "Garden", "Winter", "Empire", "Silent", "Blue"]
+NAMES = ["Frank Herbert", "Jane Austen", "Mary Shelley", "Leo Tolstoy", "Toni Morrison", "Ursula Le Guin"]
+
+
+def seed(db, User, Book, users, books, batch=5000):
+    rows = [{"first_name": "Seed", "last_name": "User", "email_id": f"user{i}@seed.test",
+             "password_hash": "x", "role": "admin" if i % 100 == 0 else "user"} for i in range(users)]
+    for start in range(0, len(rows), batch):
+        db.session.execute(User.__table__.insert(), rows[start:start + batch])
+
+    random.seed(42)
+    for start in range(0, books, batch):
+        rows = [{"Name": f"{random.choice(WORDS)} {random.choice(WORDS)}", "Author": random.choice(NAMES),
+                 "user_id": random.randint(1, users)} for _ in range(min(batch, books - start))]
+        db.session.execute(Book.__table__.insert(), rows)
+
+    db.session.commit()
+
+
+#the queries issued by the list endpoints, see app/blueprints
+
+def endpoint_queries(sa, User, Book, users):
+    user_id = users // 2
+
+    return {
+        "GET /books?user_id=&after=": sa.select(Book).where(Book.user_id == user_id).order_by(Book.id).limit(11),
+        "GET /users/<id>/books": sa.select(Book).where(Book.user_id == user_id),
+        "GET /books?Author=": sa.select(Book).where(Book.Author.like("%Austen%")).limit(10),
+        "GET /books?sort=Name": sa.select(Book).order_by(Book.Name, Book.id).limit(10),
+        "GET /books?sort=-Author&after=": sa.select(Book).where(Book.Author <= "Leo Tolstoy", sa.or_(Book.Author < "Leo Tolstoy", Book.id < 1000))
+                                              .order_by(Book.Author.desc(), Book.id.desc()).limit(11),
+        "GET /users?role=admin&after=": sa.select(User).where(User.role == "admin").order_by(User.id).limit(11),
+        "GET /users?email_id=": sa.select(User).where(User.email_id.startswith("user123")).limit(10),
+    }
+
+
+def explain(connection, statement):
+    compiled = statement.compile(connection, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN " if connection.dialect.name == "sqlite" else "EXPLAIN "
+    rows = connection.exec_driver_sql(prefix + str(compiled)).all()
+
+    if connection.dialect.name == "sqlite":
+        return [row[-1] for row in rows]
+
+    return [" ".join(str(value) for value in row) for row in rows]
+
+
+def latency(connection, statement, repeat):
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        connection.execute(statement).all()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings)
+
+
+def report(engine, queries, repeat):
+    results = {}
+
+    with engine.connect() as connection:
+        for label, statement in queries.items():
+            results[label] = (latency(connection, statement, repeat), explain(connection, statement))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-uri", help="defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    uri = args.database_uri or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "query_plans.db")
+    os.environ["DATABASE_URI"] = uri
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+    import sqlalchemy as sa
+    from app import create_app, db
+    from app.models.book import Book
+    from app.models.user import User
+
+    app = create_app()
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        print(f"seeding {args.users} users and {args.books} books into {db.engine.url.render_as_string()}")
+        seed(db, User, Book, args.users, args.books)
+
+        indexes = [index for table in (Book.__table__, User.__table__) for index in table.indexes if index.name in INDEXES]
+        queries = endpoint_queries(sa, User, Book, args.users)
+
+        for index in indexes:
+            index.drop(db.engine)
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("ANALYZE" if db.engine.dialect.name == "sqlite" else "ANALYZE TABLE book, user")
+        before = report(db.engine, queries, args.repeat)
+
+        for index in indexes:
+            index.create(db.engine)
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("ANALYZE" if db.engine.dialect.name == "sqlite" else "ANALYZE TABLE book, user")
+        after = report(db.engine, queries, args.repeat)
+
+        for label in queries:
+            before_ms, before_plan = before[label]
+            after_ms, after_plan = after[label]
+
+            print(f"\n{label}")
+            print(f"  before {before_ms:9.3f} ms  {' | '.join(before_plan)}")
+            print(f"  after  {after_ms:9.3f} ms  {' | '.join(after_plan)}")
+
+
+if __name__ == "__main__":
+    main()
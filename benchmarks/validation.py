@@ -0,0 +1,130 @@
+"""Microbenchmark of the request validation helpers
+
+Compares the per-call cost of the helpers that used to live in the blueprints
+(patterns compiled on every call, email deliverability checked through DNS)
+with the shared schema driven module in app/validation.py.
+
+"before" is the old validate_user_create as it was, so it looks the email domain up in DNS
+like it did by default, which needs network access. --no-dns turns the lookup off for offline runs.
+
+Usage: python -m benchmarks.validation [--number 20000] [--dns-number 200] [--no-dns]
+"""
+import argparse
+import re
+import timeit
+import email_validator
+from email_validator import validate_email, EmailNotValidError
+from app import validation
+
+PAYLOAD = {
+    "first_name": "Ada",
+    "last_name": "Lovelace",
+    "email_id": "ada@gmail.com",
+    "password": "Passw0rd!",
+    "role": "user",
+}
+
+
+#verbatim copy of validate_password and validate_user_create from app/blueprints/auth/routes.py
+#before they moved to app/validation.py, kept only to measure against
+
+#method to validate a password
+
+def validate_password(password):
+    #rules: min 8 chars, at least 1 uppercase, 1 lowercase, 1 digit, 1 special char
+    pattern = r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&])[A-Za-z\d@$!%*?&]{8,}$'
+
+    if re.match(pattern, password):
+        return True
+    
+    return False
+
+
+#method to validate a user
+
+def validate_user_create(data):
+    errors = {}
+    
+    name_pattern = re.compile(r"^[A-Za-z ]+$")
+    
+    if not data:
+        errors["data"] = "User data is required"
+        return errors
+    
+    #first_name
+    
+    if "first_name" not in data or not data["first_name"]:
+        errors["first_name"] = "First name is required"
+        
+    elif not name_pattern.match(data["first_name"]):
+        errors["first_name"] = "First name should only contain alphabets and spaces"
+        
+    #last_name
+        
+    if "last_name" not in data or not data["last_name"]:
+        errors["last_name"] = "Last name is required"
+        
+    elif not name_pattern.match(data["last_name"]):
+        errors["last_name"] = "Last name should only contain alphabets and spaces"
+        
+    #email
+    
+    if "email_id" not in data or not data["email_id"]:
+        errors["email_id"] = "email id is required"
+    
+    else:
+        try:
+            validate_email(data["email_id"])
+        except EmailNotValidError as e:
+            errors["email_id"] = str(e)
+            
+    #password
+    
+    if "password" not in data or not data["password"]:
+        errors["password"] = "Password is required"
+        
+    elif not validate_password(data["password"]):
+        errors["password"] = "password must contain min 8 chars, at least 1 uppercase, 1 lowercase, 1 digit, 1 special char"
+        
+    #role
+        
+    if "role" in data:
+        if not data["role"]:
+            errors["role"] = "Invalid role"
+        if data["role"].lower() != "admin" and data["role"].lower() != "user":
+            errors["role"] = "Invalid role"
+            
+            
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="calls per measurement")
+    parser.add_argument("--dns-number", type=int, default=200, help="calls of the previous helper when it does DNS lookups")
+    parser.add_argument("--no-dns", action="store_true", help="turn off the DNS lookup of the previous helper, for offline runs")
+    args = parser.parse_args()
+
+    #the previous helper used the email_validator default, which is to check deliverability
+
+    email_validator.CHECK_DELIVERABILITY = not args.no_dns
+    number = args.number if args.no_dns else min(args.number, args.dns_number)
+
+    errors = validate_user_create(PAYLOAD)
+
+    if errors:
+        raise SystemExit(f"the previous helper rejected the payload: {errors}, without network access run with --no-dns")
+
+    before = timeit.timeit(lambda: validate_user_create(PAYLOAD), number=number)
+    after = timeit.timeit(lambda: validation.validate_user_create(PAYLOAD), number=args.number)
+
+    before_us = before / number * 1e6
+    after_us = after / args.number * 1e6
+
+    print(f"before: {before_us:10.1f} us per validate_user_create ({'without' if args.no_dns else 'with'} DNS lookup)")
+    print(f"after:  {after_us:10.1f} us per validate_user_create")
+    print(f"speedup: {before_us / after_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
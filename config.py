@@ -8,4 +8,116 @@ load_dotenv()
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
\ No newline at end of file
+    JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+    
+    #connection pool, connections are checked before use and replaced before the server drops them
+    #pool_size, max_overflow and pool_timeout are not used for SQLite
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    
+    #instrumentation, a Server-Timing header on every response, logs of the requests / queries slower than the thresholds
+    #and per endpoint latency histograms at GET /metrics
+    INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "true").lower() == "true"
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", 500))
+    SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", 100))
+    
+    #read replicas, comma separated urls, GET requests read from them and fall back to the primary
+    #a replica that fails its health check is skipped until it passes the next one (every REPLICA_HEALTH_INTERVAL seconds)
+    REPLICA_DATABASE_URIS = os.getenv("REPLICA_DATABASE_URIS", "")
+    REPLICA_HEALTH_INTERVAL = int(os.getenv("REPLICA_HEALTH_INTERVAL", 5))
+    
+    #database url used by the ASGI entry point, derived from DATABASE_URI (mysql -> aiomysql, sqlite -> aiosqlite) when not set
+    #the async handlers don't go through the replica routing, this can be a replica url to keep their reads off the primary
+    ASYNC_DATABASE_URI = os.getenv("ASYNC_DATABASE_URI")
+    
+    #threads of the ASGI entry point running the requests that go to the flask app (lists, writes, auth)
+    ASGI_SYNC_THREADS = int(os.getenv("ASGI_SYNC_THREADS", 8))
+    
+    #email ids are only checked for syntax unless DNS lookups of the domain are turned on
+    EMAIL_CHECK_DELIVERABILITY = os.getenv("EMAIL_CHECK_DELIVERABILITY", "false").lower() == "true"
+    
+    #responses are encoded with orjson when it is installed
+    FAST_JSON = os.getenv("FAST_JSON", "true").lower() == "true"
+    
+    #cache of the users behind JWTs, entries are dropped when a user is updated or deleted
+    IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", 10000))
+    IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", 60))
+    
+    #bulk endpoints
+    BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 10000))
+    BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 1000))
+    
+    #password hashing, hashes made with another method are upgraded on the next login
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+    PASSWORD_HASH_TIMEOUT = int(os.getenv("PASSWORD_HASH_TIMEOUT", 30))
+    
+    #login throttling, a client ip / email gets that many attempts and the budget refills over the period (seconds)
+    LOGIN_RATE_LIMIT_ENABLED = os.getenv("LOGIN_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    LOGIN_RATE_LIMIT_PER_IP = int(os.getenv("LOGIN_RATE_LIMIT_PER_IP", 20))
+    LOGIN_RATE_LIMIT_PER_EMAIL = int(os.getenv("LOGIN_RATE_LIMIT_PER_EMAIL", 5))
+    LOGIN_RATE_LIMIT_PERIOD = int(os.getenv("LOGIN_RATE_LIMIT_PERIOD", 60))
+    RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+    RATELIMIT_MAX_KEYS = int(os.getenv("RATELIMIT_MAX_KEYS", 100000))
+    
+    #cache of the admin list responses (GET /books, GET /users), writes invalidate it
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 30))
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+    RESPONSE_CACHE_STORAGE_URI = os.getenv("RESPONSE_CACHE_STORAGE_URI", "memory://")
+    
+    #how GET /books counts the total: exact, cached (for COUNT_CACHE_TTL seconds per filter set) or approximate
+    BOOK_COUNT_STRATEGY = os.getenv("BOOK_COUNT_STRATEGY", "exact")
+    COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", 60))
+    
+    #GET /changes holds back changes younger than this many seconds, so writes still committing are not skipped
+    CHANGES_SETTLE_SECONDS = int(os.getenv("CHANGES_SETTLE_SECONDS", 2))
+
+
+#Production defaults, a pool per worker process large enough for its threads (see gunicorn.conf.py)
+#connections are recycled before the usual 300 seconds idle timeout of hosted MySQL
+#and a request waits at most 10 seconds for a connection instead of piling up
+
+class ProductionConfig(Config):
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 280))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 10))
+    
+    #every gunicorn worker has its own hashing pool and a scrypt hash takes about 32 MiB, so the CPUs are
+    #shared between the pools instead of every pool getting one process per CPU, a pool has at least one
+    #process so with the default 2 * CPUs + 1 workers that is one process per worker (about 2 * CPUs in total),
+    #run fewer workers than CPUs to bring the total down to about one per CPU
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS",
+                                          max(1, (os.cpu_count() or 1) // int(os.getenv("GUNICORN_WORKERS", (os.cpu_count() or 1) * 2 + 1)))))
+
+
+#Config class per APP_ENV
+
+CONFIGS = {
+    "development": Config,
+    "production": ProductionConfig,
+}
+
+
+#method to build SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* settings, for the primary or a replica url
+
+def engine_options(config, uri=None):
+    options = {
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+    }
+    
+    uri = uri or config["SQLALCHEMY_DATABASE_URI"] or ""
+    
+    if not uri.startswith("sqlite"):
+        options["pool_size"] = config["DB_POOL_SIZE"]
+        options["max_overflow"] = config["DB_MAX_OVERFLOW"]
+        options["pool_timeout"] = config["DB_POOL_TIMEOUT"]
+    
+    return options
@@ -0,0 +1,27 @@
+import multiprocessing
+import os
+
+#gunicorn settings, read from the environment
+#start with: APP_ENV=production gunicorn run:app
+#or for the ASGI app: APP_ENV=production gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+#every worker has its own connection pool, keep GUNICORN_WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the
+#max_connections of the database and DB_POOL_SIZE at or above GUNICORN_THREADS
+#every worker also has its own password hashing pool of PASSWORD_HASH_WORKERS processes, in production
+#it defaults to CPUs // GUNICORN_WORKERS (at least 1), with the default workers that is one process per
+#worker or about 2 * CPUs in total, the total only matches the CPUs when GUNICORN_WORKERS <= CPUs
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+#workers are replaced after that many requests so a slow leak cannot grow forever
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
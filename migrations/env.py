@@ -51,6 +51,17 @@ def get_metadata():
     return target_db.metadata
 
 
+# the book_fts tables are created by hand in a migration (SQLite full text
+# search) and ix_book_fulltext only exists on MySQL, autogenerate knows about
+# neither so it must not try to drop or create them
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "table" and name.startswith("book_fts"):
+        return False
+    if type_ == "index" and name == "ix_book_fulltext":
+        return context.get_context().dialect.name == "mysql"
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +76,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +105,8 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
@@ -0,0 +1,57 @@
+"""add book full text search
+
+Revision ID: b3c1f0a9d2e4
+Revises: 7fbd48164ec5
+Create Date: 2026-10-18 10:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3c1f0a9d2e4'
+down_revision = '7fbd48164ec5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        op.create_index('ix_book_fulltext', 'book', ['Name', 'Author'], unique=False, mysql_prefix='FULLTEXT')
+
+    elif dialect == 'sqlite':
+        # external content FTS5 table kept in sync with book by triggers
+        op.execute("CREATE VIRTUAL TABLE book_fts USING fts5(Name, Author, content='book', content_rowid='id')")
+        op.execute("""
+            CREATE TRIGGER book_fts_ai AFTER INSERT ON book BEGIN
+                INSERT INTO book_fts(rowid, Name, Author) VALUES (new.id, new.Name, new.Author);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER book_fts_ad AFTER DELETE ON book BEGIN
+                INSERT INTO book_fts(book_fts, rowid, Name, Author) VALUES ('delete', old.id, old.Name, old.Author);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER book_fts_au AFTER UPDATE ON book BEGIN
+                INSERT INTO book_fts(book_fts, rowid, Name, Author) VALUES ('delete', old.id, old.Name, old.Author);
+                INSERT INTO book_fts(rowid, Name, Author) VALUES (new.id, new.Name, new.Author);
+            END
+        """)
+        op.execute("INSERT INTO book_fts(book_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        op.drop_index('ix_book_fulltext', table_name='book')
+
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS book_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS book_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS book_fts_ai")
+        op.execute("DROP TABLE IF EXISTS book_fts")
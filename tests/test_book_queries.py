@@ -0,0 +1,76 @@
+import os
+
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-that-is-long-enough-for-hs256")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ.setdefault("LOGIN_RATE_LIMIT_ENABLED", "false")
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import create_app, db
+from app.models.book import Book
+from app.models.user import User
+from config import Config
+
+#POST /users/<id>/books/bulk has to send the books of a chunk in one INSERT whatever the number of books
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    #the settings are read from the environment when config is imported, so they are set on the class
+
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'test.db'}")
+    app = create_app()
+    app.config.update(TESTING=True)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+#method to add books in bulk, returns the response and the INSERT statements run on the book table
+
+def bulk_insert_books(client, user_id, books):
+    headers = {"Authorization": "Bearer " + create_access_token(identity=str(user_id), additional_claims={"role": "user"})}
+    inserts = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO book"):
+            inserts.append(statement)
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+
+    try:
+        response = client.post(f"/users/{user_id}/books/bulk", json=books, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert response.status_code == 201, response.get_json()
+    return response, len(inserts)
+
+
+def test_bulk_insert_runs_one_insert_per_chunk(app):
+    user = User(first_name="User", last_name="One", email_id="user@example.com", password_hash="x", role="user")
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+
+    books = [{"Name": f"Book {name}", "Author": "Author"} for name in "abcde"]
+
+    _, one = bulk_insert_books(client, user.id, books[:1])
+    response, five = bulk_insert_books(client, user.id, books)
+
+    assert one == five == 1
+
+    #the returned ids belong to the books at the same index of the request
+
+    names = {book.id: book.Name for book in db.session.scalars(db.select(Book))}
+    assert [names[result["id"]] for result in response.get_json()["results"]] == [book["Name"] for book in books]
+
+    app.config["BULK_CHUNK_SIZE"] = 2
+    _, chunked = bulk_insert_books(client, user.id, books)
+
+    assert chunked == 3
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-that-is-long-enough-for-hs256")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ.setdefault("LOGIN_RATE_LIMIT_ENABLED", "false")
+
+import pytest
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.book import Book
+from app.models.user import User
+from config import Config
+
+#GET requests read from the replica, writes and the reads after them from the primary,
+#and the primary answers the reads when the replica is down
+#the primary and the replica are two SQLite files, the replica is opened with mode=rw so it can't be
+#opened any more once its file is removed
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    primary = tmp_path / "primary.db"
+    replica = tmp_path / "replica.db"
+    sqlite3.connect(replica).close()
+
+    #the settings are read from the environment when config is imported, so they are set on the class
+
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{primary}")
+    monkeypatch.setattr(Config, "REPLICA_DATABASE_URIS", f"sqlite:///file:{replica}?mode=rw&uri=true")
+    monkeypatch.setattr(Config, "REPLICA_HEALTH_INTERVAL", 0)
+    app = create_app()
+    app.config.update(TESTING=True)
+
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines["replica-0"])
+        yield app
+        db.session.remove()
+        db.drop_all(bind_key=None)
+
+    #db is shared by the apps of all the tests, the next ones have no replica bind
+
+    db.metadatas.pop("replica-0", None)
+
+
+#method to add the same user to both databases and a book to one of them, returns the auth headers
+
+def add_user_with_book(book_name, engine):
+    user = User(first_name="User", last_name="One", email_id="user@example.com", password_hash="x", role="user")
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+
+    with db.engines["replica-0"].begin() as connection:
+        connection.execute(User.__table__.insert(), [{"id": user_id, "first_name": "User", "last_name": "One",
+                                                      "email_id": "user@example.com", "password_hash": "x", "role": "user"}])
+
+    with engine.begin() as connection:
+        connection.execute(Book.__table__.insert(), [{"Name": book_name, "Author": "Author", "user_id": user_id}])
+
+    #the requests of the test client share the app context of the fixture, a new session starts without
+    #the write of this setup
+
+    db.session.remove()
+
+    return user_id, {"Authorization": "Bearer " + create_access_token(identity=str(user_id), additional_claims={"role": "user"})}
+
+
+def test_get_reads_from_the_replica(app):
+    user_id, headers = add_user_with_book("Replica Book", db.engines["replica-0"])
+
+    response = app.test_client().get(f"/users/{user_id}/books", headers=headers)
+
+    assert response.status_code == 200, response.get_json()
+    assert [book["Name"] for book in response.get_json()] == ["Replica Book"]
+
+
+def test_reads_after_a_write_stay_on_the_primary(app):
+    add_user_with_book("Replica Book", db.engines["replica-0"])
+
+    with app.test_request_context("/", method="GET"):
+        assert db.session.get_bind() is db.engines["replica-0"]
+
+        db.session.add(Book(Name="Primary Book", Author="Author", user_id=1))
+        db.session.flush()
+
+        assert db.session.get_bind() is db.engine
+        assert db.session.scalars(db.select(Book.Name)).all() == ["Primary Book"]
+
+        db.session.rollback()
+
+
+def test_get_falls_back_to_the_primary_when_the_replica_is_down(app, tmp_path):
+    user_id, headers = add_user_with_book("Primary Book", db.engine)
+
+    db.engines["replica-0"].dispose()
+    os.remove(tmp_path / "replica.db")
+
+    response = app.test_client().get(f"/users/{user_id}/books", headers=headers)
+
+    assert response.status_code == 200, response.get_json()
+    assert [book["Name"] for book in response.get_json()] == ["Primary Book"]
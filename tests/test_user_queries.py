@@ -0,0 +1,89 @@
+import os
+
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-that-is-long-enough-for-hs256")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+os.environ.setdefault("LOGIN_RATE_LIMIT_ENABLED", "false")
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import create_app, db
+from app.models.book import Book
+from app.models.user import User
+from config import Config
+
+#GET /users has to run the same number of SQL statements whatever the number of users on the page
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    #the settings are read from the environment when config is imported, so they are set on the class
+
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'test.db'}")
+    app = create_app()
+    app.config.update(TESTING=True)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+#method to add users with 2 books each, returns their ids
+
+def add_users(n, role="user"):
+    users = [User(first_name="User", last_name=str(i), email_id=f"{role}{i}@example.com", password_hash="x", role=role) for i in range(n)]
+    db.session.add_all(users)
+    db.session.flush()
+
+    db.session.add_all([Book(Name=f"Book {i}", Author="Author", user_id=user.id) for i, user in enumerate(users) for _ in range(2)])
+    db.session.commit()
+
+    return [user.id for user in users]
+
+
+#method to count the statements run by a request
+
+def count_statements(client, url, headers):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert response.status_code == 200, response.get_json()
+    return response, len(statements)
+
+
+def statements_for_users(app, n):
+    admin_id = add_users(1, role="admin")[0]
+    add_users(n - 1)
+    headers = {"Authorization": "Bearer " + create_access_token(identity=str(admin_id), additional_claims={"role": "admin"})}
+    client = app.test_client()
+
+    #first request fills the identity cache, the second one is measured
+
+    count_statements(client, f"/users/?limit={n}", headers)
+    response, statements = count_statements(client, f"/users/?limit={n}", headers)
+
+    assert len(response.get_json()["users"]) == n
+    assert all(len(user["books"]) == 2 for user in response.get_json()["users"])
+    return statements
+
+
+def test_get_users_statements_do_not_grow_with_users(app):
+    one = statements_for_users(app, 1)
+
+    db.session.execute(Book.__table__.delete())
+    db.session.execute(User.__table__.delete())
+    db.session.commit()
+
+    assert statements_for_users(app, 50) == one